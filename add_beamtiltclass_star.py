@@ -57,7 +57,7 @@ class AddBeamTiltClass:
 
         self.validate(args)
 
-        md = MetaData(args.i)
+        md = MetaData(args.i, keepTokens=True)
         md.addLabels("data_particles", "rlnBeamTiltClass")
 
         self.mprint("Reading in input star file.....")
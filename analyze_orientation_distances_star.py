@@ -13,7 +13,7 @@ from lib.matrix3 import matrix_from_euler
 class AnalyzeSpatialAngularDistanceStar:
     def define_parser(self):
         self.parser = argparse.ArgumentParser(
-            description="Calculates the spatial distance and angular distance between corresponding particles in --i1 and --i2. Output contains the particles from --i1 with additional columns for the spatial (rlnSpatDist), angular distances (rlnAngDist), rlnOriginXAngstDiff, rlnOriginYAngstDiff, rlnAngleRotDiff , rlnAngleTiltDiff, and rlnAnglePsiDiff.",
+            description="Calculates the spatial distance and angular distance between corresponding particles in --i1 and --i2. Output contains the particles from --i1 having a corresponding particle in --i2 with additional columns for the spatial (rlnSpatDist), angular distances (rlnAngDist), rlnOriginXAngstDiff, rlnOriginYAngstDiff, rlnAngleRotDiff , rlnAngleTiltDiff, and rlnAnglePsiDiff.",
             formatter_class=RawTextHelpFormatter)
         add = self.parser.add_argument
         add('--i1', default="STDIN", help="Input1 STAR filename (Default: STDIN).")
@@ -81,18 +81,16 @@ class AnalyzeSpatialAngularDistanceStar:
             diff -= 360.0
         return diff
 
-    def getSpatialAngularDistances(self, particles1, particles2):
+    def getSpatialAngularDistances(self, particles1, particles2, matches):
         # progress bar initialization
         progress_step = max(int(len(particles1) / 20), 1)
         i = 0
-
-        # Create a dictionary for faster lookup of particles2
-        particles2_dict = {p.rlnImageName: p for p in particles2}
+        matchedParticles = []
 
         # Process only matching particles
-        for particle in particles1:
-            if particle.rlnImageName in particles2_dict:
-                comp_particle = particles2_dict[particle.rlnImageName]
+        for particle, match in zip(particles1, matches.tolist()):
+            if match >= 0:
+                comp_particle = particles2[match]
 
                 # Calculate all distances
                 particle.rlnSpatDist = self.calculateSpatialDistance(particle, comp_particle)
@@ -105,6 +103,7 @@ class AnalyzeSpatialAngularDistanceStar:
                 # Calculate origin differences
                 particle.rlnOriginXAngstDiff = particle.rlnOriginXAngst - comp_particle.rlnOriginXAngst
                 particle.rlnOriginYAngstDiff = particle.rlnOriginYAngst - comp_particle.rlnOriginYAngst
+                matchedParticles.append(particle)
 
             i += 1
             # a simple progress bar
@@ -116,7 +115,7 @@ class AnalyzeSpatialAngularDistanceStar:
         if self.args.o != "STDOUT":
             sys.stdout.write('\n')
 
-        return particles1
+        return matchedParticles
 
     def main(self):
         self.define_parser()
@@ -141,10 +140,11 @@ class AnalyzeSpatialAngularDistanceStar:
 
         particles1 = self.get_particles(md1, dataTableName)
         particles2 = self.get_particles(md2, dataTableName)
+        # matching particle of Input2 (the last one with the same image name) for each particle of Input1
+        matches = md2.index(dataTableName, "rlnImageName").lookup(getattr(md1, dataTableName), last=True)
 
         if md1.version == "3.1":
-            mdOut = md1.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md1.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
@@ -155,9 +155,13 @@ class AnalyzeSpatialAngularDistanceStar:
                         ["rlnOriginXAngstDiff", "rlnOriginYAngstDiff", "rlnAngleRotDiff", "rlnAngleTiltDiff",
                          "rlnAnglePsiDiff", "rlnSpatDist", "rlnAngDist"])
 
-        mdOut.addData(dataTableName, self.getSpatialAngularDistances(particles1, particles2))
+        matchedParticles = self.getSpatialAngularDistances(particles1, particles2, matches)
+        mdOut.addData(dataTableName, matchedParticles)
 
         self.mprint("%s particles were processed..." % str((len(particles1))))
+        if len(matchedParticles) < len(particles1):
+            self.mprint("%d particles without a corresponding particle in %s were left out." % (
+                len(particles1) - len(matchedParticles), args.i2))
 
         mdOut.write(args.o)
 
@@ -61,16 +61,16 @@ class AssignLabelStar:
             particles.append(particle)
         return particles
 
-    def assign_column(self, particles1, particles2, col_lb, comp_lb):
-        lookup = {
-            getattr(p, comp_lb): getattr(p, col_lb)
-            for p in particles2
-        }
+    def assign_column(self, md1, md2, dataTableName, col_lb, comp_lb):
+        particles1 = self.get_particles(md1, dataTableName)
+        particles2 = self.get_particles(md2, dataTableName)
+
+        # last row of Input2 with the same comp_lb value for each row of Input1
+        matches = md2.index(dataTableName, comp_lb).lookup(getattr(md1, dataTableName), last=True)
 
-        for particle in particles1:
-            key = getattr(particle, comp_lb)
-            if key in lookup:
-                setattr(particle, col_lb, lookup[key])
+        for particle, match in zip(particles1, matches.tolist()):
+            if match >= 0:
+                setattr(particle, col_lb, getattr(particles2[match], col_lb))
 
         return particles1
 
@@ -102,15 +102,11 @@ class AssignLabelStar:
         if args.comp_lb not in i2labels:
             self.error("Column %s is not present in Input2 star file." % args.comp_lb)
 
-        particles1 = self.get_particles(md1, dataTableName)
-        particles2 = self.get_particles(md2, dataTableName)
-
         self.mprint(
             "Assigning values for Input1 label %s where the %s of Input2 matches Input1" % (args.col_lb, args.comp_lb))
 
         if md1.version == "3.1":
-            mdOut = md1.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md1.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
@@ -120,9 +116,9 @@ class AssignLabelStar:
         if args.col_lb not in i1labels:
             mdOut.addLabels(dataTableName, args.col_lb)
 
-        mdOut.addData(dataTableName, self.assign_column(particles1, particles2, args.col_lb, args.comp_lb))
+        mdOut.addData(dataTableName, self.assign_column(md1, md2, dataTableName, args.col_lb, args.comp_lb))
 
-        self.mprint("%s particles were processed..." % str((len(particles1))))
+        self.mprint("%s particles were processed..." % str(md1.size(dataTableName)))
 
         mdOut.write(args.o)
         self.mprint(f"Total execution time: {time.time() - start_total:.2f} seconds")
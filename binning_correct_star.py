@@ -2,8 +2,7 @@
 
 import os
 import sys
-import copy
-from metadata import MetaData
+from metadata import MetaData, StarWriter
 import argparse
 
 
@@ -38,24 +37,18 @@ class BinCorrectStar:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
     def binParticles(self, particles, binFactor, correctOrigin, correctApix, suf_orig, suf_new):
-        newParticles = []
-        for particle in copy.deepcopy(particles):
+        particleCounter = 0
+        for particle in particles:
             if correctOrigin:
                 particle.rlnOriginX = particle.rlnOriginX / binFactor
                 particle.rlnOriginY = particle.rlnOriginY / binFactor
             if correctApix:
                 particle.rlnDetectorPixelSize = particle.rlnDetectorPixelSize * binFactor
             particle.rlnImageName = particle.rlnImageName.replace(suf_orig, suf_new)
-            newParticles.append(particle)
-        print("Processed " + str(len(newParticles)) + " particles.")
-        return newParticles
+            particleCounter += 1
+            yield particle
+        print("Processed " + str(particleCounter) + " particles.")
 
     def main(self):
         self.define_parser()
@@ -65,40 +58,34 @@ class BinCorrectStar:
 
         print("Binning correct input star file. Using binning factor %s." % str(args.bin_factor))
 
-        md = MetaData(args.i)
-
-        new_particles = []
-
-        particles = self.get_particles(md)
+        md = MetaData()
+        particles = md.iterRows(args.i)
+        iLabels = md.getLabels("data_particles" if md.version == "3.1" else "data_")
 
-        if (hasattr(particles[0], 'rlnOriginX')) and (hasattr(particles[0], 'rlnOriginY')):
+        if ('rlnOriginX' in iLabels) and ('rlnOriginY' in iLabels):
             correctOrigin = True
         else:
             print("Note: rlnOriginX or rlnOriginY not found in input star file. Not correcting for particle shift.")
             correctOrigin = False
 
-        if hasattr(particles[0], 'rlnDetectorPixelSize'):
+        if 'rlnDetectorPixelSize' in iLabels:
             correctApix = True
         else:
             print("Note: rlnDetectorPixelSize not found in input star file. Not correcting for pixel size.")
             correctApix = False
 
-        new_particles.extend(
-            self.binParticles(particles, args.bin_factor, correctOrigin, correctApix, args.suf_orig, args.suf_new))
-
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-        mdOut.addData(dataTableName, new_particles)
-
-        mdOut.write(args.o)
+        with StarWriter(args.o, mdOut, dataTableName, source=md) as writer:
+            writer.writeRows(self.binParticles(particles, args.bin_factor, correctOrigin, correctApix, args.suf_orig,
+                                               args.suf_new))
 
         print("New star file %s created. Have fun!" % args.o)
 
@@ -7,8 +7,6 @@ import argparse
 from os import listdir
 from os.path import isfile, join
 from xml.dom import minidom
-from matplotlib import pyplot as plt
-from sklearn.cluster import KMeans
 
 parser = argparse.ArgumentParser(
     description="Clusters beam-shifts extracted from xml files into beam-tilt classes.")
@@ -56,6 +54,9 @@ if not os.path.exists(args.i):
 
 
 def elbowMethod(maxClusters, inputArray, maxIter, nInit):
+    from matplotlib import pyplot as plt
+    from sklearn.cluster import KMeans
+
     wcss = []
     for i in range(1, maxClusters):
         kmeans = KMeans(n_clusters=i, init='k-means++', max_iter=maxIter, n_init=nInit, random_state=0)
@@ -69,6 +70,9 @@ def elbowMethod(maxClusters, inputArray, maxIter, nInit):
 
 
 def kmeansClustering(nClusters, inputArray, maxIter, nInit):
+    from matplotlib import pyplot as plt
+    from sklearn.cluster import KMeans
+
     kmeans = KMeans(n_clusters=nClusters, init='k-means++', max_iter=maxIter, n_init=nInit, random_state=0)
     pred_y = kmeans.fit_predict(inputArray)
     # make cluster numbering start form 1 not 0
@@ -2,7 +2,7 @@
 
 import os
 import sys
-from metadata import MetaData
+from metadata import MetaData, StarWriter
 import argparse
 
 
@@ -40,25 +40,18 @@ class SelAstgStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md, dataTableName):
-        particles = []
-        for particle in getattr(md, dataTableName):
-            particles.append(particle)
-        return particles
-
     def selParticles(self, particles, astg, res, resLabel):
-        newParticles = []
-        while len(particles) > 0:
-            selectedParticle = particles.pop(0)
+        selectedCounter = 0
+        for selectedParticle in particles:
             if res == 0:
-                if abs(selectedParticle.rlnDefocusU - selectedParticle.rlnDefocusV) <= astg:
-                    newParticles.append(selectedParticle)
+                selected = abs(selectedParticle.rlnDefocusU - selectedParticle.rlnDefocusV) <= astg
             else:
-                if (abs(selectedParticle.rlnDefocusU - selectedParticle.rlnDefocusV) <= astg) and (
-                        getattr(selectedParticle, resLabel) <= res):
-                    newParticles.append(selectedParticle)
-        self.mprint(str(len(newParticles)) + " particles included in selection.")
-        return newParticles
+                selected = (abs(selectedParticle.rlnDefocusU - selectedParticle.rlnDefocusV) <= astg) and (
+                        getattr(selectedParticle, resLabel) <= res)
+            if selected:
+                selectedCounter += 1
+                yield selectedParticle
+        self.mprint(str(selectedCounter) + " particles included in selection.")
 
     def main(self):
         self.define_parser()
@@ -68,10 +61,13 @@ class SelAstgStar:
 
         self.mprint("Selecting particles/micrographs from star file...")
 
-        md = MetaData(args.i)
-
         dataTableName = args.data
 
+        # too astigmatic rows are skipped while reading, the resolution label is known only after the header
+        md = MetaData()
+        particles = md.iterRows(args.i, dataTableName,
+                                where=[(("rlnDefocusU", "rlnDefocusV"), lambda u, v: abs(u - v) <= args.astg)])
+
         if md.version == "3.1":
             ilabels = md.getLabels(dataTableName)
         else:
@@ -92,23 +88,16 @@ class SelAstgStar:
             else:
                 resLabel = "rlnCtfMaxResolution"
 
-        new_particles = []
-
-        particles = self.get_particles(md, dataTableName)
-
-        new_particles.extend(self.selParticles(particles, args.astg, args.res, resLabel))
-
         if md.version == "3.1":
-            mdOut = md.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-        mdOut.addData(dataTableName, new_particles)
-        mdOut.write(args.o)
+        with StarWriter(args.o, mdOut, dataTableName, source=md) as writer:
+            writer.writeRows(self.selParticles(particles, args.astg, args.res, resLabel))
 
         self.mprint("New star file %s created. Have fun!" % args.o)
 
@@ -92,9 +92,8 @@ class FlipParticleCoordinates:
             particles = self.get_particles(md)
             new_particles.extend(self.flipCoordinates(particles, flipAxis, args.axis_size))
             if md.version == "3.1":
-                mdOut = md.clone()
                 dataTableName = "data_particles"
-                mdOut.removeDataTable(dataTableName)
+                mdOut = md.cloneWithout(dataTableName)
             else:
                 mdOut = MetaData()
                 dataTableName = "data_"
@@ -119,9 +118,8 @@ class FlipParticleCoordinates:
                     particles = self.get_particles(md)
                     new_particles.extend(self.flipCoordinates(particles, flipAxis, args.axis_size ))
                     if md.version == "3.1":
-                        mdOut = md.clone()
                         dataTableName = "data_particles"
-                        mdOut.removeDataTable(dataTableName)
+                        mdOut = md.cloneWithout(dataTableName)
                     else:
                         mdOut = MetaData()
                         dataTableName = "data_"
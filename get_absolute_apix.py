@@ -36,7 +36,7 @@ class AbsoluteApixStar:
         args = self.parser.parse_args()
         self.validate(args)
 
-        md = MetaData(args.i)
+        md = MetaData(args.i, tables=["data_optics"])
 
         if md.version == "3.1":
             iLabels = md.getLabels("data_optics")
@@ -5,9 +5,6 @@ import sys
 from metadata import MetaData
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-import healpy as hp
-from healpy.newvisufunc import projview
 from lib.symmetries import Symmetry
 
 
@@ -59,6 +56,7 @@ class HeatmapStar:
             self.error("Input file '%s' not found."
                        % args.i)
 
+        import matplotlib.pyplot as plt
         if args.cmap not in list(plt.colormaps):
             self.error("Colormap '%s' is not a valid matplotlib colormap. \nPlease choose one of: %s"
                        % (args.cmap, ",".join(list(plt.colormaps))))
@@ -88,9 +86,14 @@ class HeatmapStar:
 
         self.validate(args)
 
+        # the plotting libraries take long to import, they are not needed for the help
+        import matplotlib.pyplot as plt
+        import healpy as hp
+        from healpy.newvisufunc import projview
+
         print("Making orientation heatmap from star file...")
 
-        md = MetaData(args.i)
+        md = MetaData(args.i, labels=["rlnAngleRot", "rlnAngleTilt", "rlnAnglePsi"])
 
         particles = self.get_particles(md)
         print(f"Found {len(particles)} in star file.")
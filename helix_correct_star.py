@@ -69,9 +69,8 @@ class HelixCorrectStar:
             md.addLabels(['rlnHelicalTrackLength'])
 
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
@@ -7,6 +7,7 @@ from metadata import LABELS
 import argparse
 from argparse import RawTextHelpFormatter
 import time
+import numpy as np
 
 
 class JoinStar:
@@ -21,7 +22,7 @@ class JoinStar:
         add('--data', type=str, default="data_particles",
             help="Data table from star file to be used (Default: data_particles).")
         add('--lb', type=str, default="rlnMicrographName",
-            help="Label used for intersect/except joining. e.g. rlnAngleTilt, rlnDefocusU...; Default: rlnMicrographName")
+            help="Label used for intersect/except joining. e.g. rlnAngleTilt, rlnDefocusU...; Use comma separated labels to join on multiple labels (e.g. rlnMicrographName,rlnCoordinateX,rlnCoordinateY). Default: rlnMicrographName")
         add('--op', type=str, default="=",
             help="Operator used for comparison. Allowed: \"union\", \"intersect\", \"except\" ")
 
@@ -41,8 +42,9 @@ class JoinStar:
         if not os.path.exists(args.i2) and not args.i2 == "STDIN":
             self.error("Input2 file '%s' not found." % args.i2)
 
-        if args.lb not in LABELS:
-            self.error("Label %s not recognized as RELION label." % args.lb)
+        for label in args.lb.split(","):
+            if label not in LABELS:
+                self.error("Label %s not recognized as RELION label." % label)
 
         if not os.path.exists(args.i2):
             self.error("Input2 file '%s' not found." % args.i)
@@ -123,8 +125,7 @@ class JoinStar:
                             md1.setLabels(dataTableName, **dic)
 
             if md1.version == "3.1":
-                mdOut = md1.clone()
-                mdOut.removeDataTable(dataTableName)
+                mdOut = md1.cloneWithout(dataTableName)
             else:
                 mdOut = MetaData()
                 dataTableName = "data_"
@@ -146,21 +147,21 @@ class JoinStar:
                 i1labels = md1.getLabels("data_")
                 i2labels = md2.getLabels("data_")
                 dataTableName = "data_"
-            if (args.lb not in i1labels) or (args.lb not in i2labels):
-                self.error("No label %s found in Input1 or Input2 file." % args.lb)
+            joinLabels = args.lb.split(",")
+            for label in joinLabels:
+                if (label not in i1labels) or (label not in i2labels):
+                    self.error("No label %s found in Input1 or Input2 file." % label)
 
-            particles1 = self.get_particles(md1, dataTableName)
-
-            selectedValues = {getattr(p, args.lb) for p in getattr(md2, dataTableName)}
+            # rows of Input1 with a matching key in Input2
+            matched = md2.index(dataTableName, joinLabels).lookup(getattr(md1, dataTableName)) >= 0
 
             if args.op == "intersect":
-                selectedParticles = [p for p in particles1 if getattr(p, args.lb) in selectedValues]
+                selectedParticles = getattr(md1, dataTableName).take(np.flatnonzero(matched))
             else:
-                selectedParticles = [p for p in particles1 if getattr(p, args.lb) not in selectedValues]
+                selectedParticles = getattr(md1, dataTableName).take(np.flatnonzero(~matched))
 
             if md1.version == "3.1":
-                mdOut = md1.clone()
-                mdOut.removeDataTable(dataTableName)
+                mdOut = md1.cloneWithout(dataTableName)
             else:
                 mdOut = MetaData()
                 dataTableName = "data_"
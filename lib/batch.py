@@ -0,0 +1,97 @@
+import glob
+import io
+import os
+from contextlib import redirect_stdout
+from functools import partial
+
+from lib.pipeline import runStage
+
+
+def batchFiles(spec):
+    """ Input files of a batch: a glob pattern, or @file with a list of paths (one per line). """
+    if spec.startswith("@"):
+        with open(spec[1:]) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return sorted(glob.glob(spec))
+
+
+def outputPath(template, inputPath):
+    """
+    Output path of an input file, template can use {dir} (directory of the input file),
+    {file} (file name) and {name} (file name without extension), e.g. "sel/{name}_sel.star".
+    """
+    fileName = os.path.basename(inputPath)
+    return template.format(dir=os.path.dirname(inputPath) or ".", file=fileName,
+                           name=os.path.splitext(fileName)[0])
+
+
+def outputPaths(template, inputs):
+    """ Output paths of the input files, raises ValueError if two of them (or an input) get the same path. """
+    outputs = [outputPath(template, path) for path in inputs]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError("Output template '%s' gives the same output file for several input files." % template)
+    overwritten = set(map(os.path.abspath, outputs)) & set(map(os.path.abspath, inputs))
+    if overwritten:
+        raise ValueError("Output template '%s' overwrites input file %s." % (template, sorted(overwritten)[0]))
+    return outputs
+
+
+def _callFile(call):
+    # (file, result, None) or (file, None, error message), failures do not stop the batch
+    function, path = call
+    try:
+        return path, function(path), None
+    except RuntimeError as e:
+        return path, None, str(e)
+    except (Exception, SystemExit) as e:
+        return path, None, "%s: %s" % (type(e).__name__, e)
+
+
+def mapFiles(function, files, jobs=1):
+    """
+    Call function with each file, in jobs worker processes forked from this one (so the
+    modules already imported are not imported again). Yields (file, result, error) in
+    the order of files, error is None or the message of the exception raised for the file.
+    """
+    calls = [(function, path) for path in files]
+    if jobs <= 1 or len(calls) <= 1:
+        for call in calls:
+            yield _callFile(call)
+        return
+    import multiprocessing
+    with multiprocessing.get_context("fork").Pool(min(jobs, len(calls))) as pool:
+        for result in pool.imap(_callFile, calls):
+            yield result
+
+
+def runFile(path, args):
+    """
+    Run a star script in this process as if called from the command line with args, returns
+    what it printed. Raises RuntimeError with the error message of the script if it fails.
+    """
+    printed = io.StringIO()
+    try:
+        with redirect_stdout(printed):
+            runStage(path, args, capture=False)
+    except RuntimeError as e:
+        errors = [line[len("Error:"):].strip() for line in printed.getvalue().splitlines() if line.startswith("Error:")]
+        raise RuntimeError(errors[-1] if errors else str(e))
+    return printed.getvalue()
+
+
+def _runBatchFile(path, args, template, inputPath):
+    output = outputPath(template, inputPath) if template else None
+    if output and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    return output, runFile(path, args + ["--i", inputPath] + (["--o", output] if output else []))
+
+
+def runBatch(path, args, inputs, template=None, jobs=1):
+    """
+    Run a star script with args on each input file (given by --i). With a template (see
+    outputPath) the output of each file is written to its own file (given by --o), otherwise
+    the script writes to STDOUT. Yields (input, (output, printed), error) as in mapFiles.
+    """
+    if template:
+        outputPaths(template, inputs)
+    return mapFiles(partial(_runBatchFile, path, list(args), template), inputs, jobs)
@@ -0,0 +1,30 @@
+import os
+
+# directory of the star scripts
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# short command names besides the script names without "_star.py" (e.g. stats for stats_star.py)
+ALIASES = {
+    "select": "select_values_star",
+}
+
+
+def commands():
+    """ Command names of the star scripts (script names, also without "_star", and aliases) with their script files. """
+    commands = {}
+    for fileName in sorted(os.listdir(SCRIPTS_DIR)):
+        name = fileName[:-len(".py")]
+        if not fileName.endswith(".py") or name in ("starpy", "metadata"):
+            continue
+        commands[name] = fileName
+        if name.endswith("_star"):
+            commands.setdefault(name[:-len("_star")], fileName)
+    for alias, name in ALIASES.items():
+        commands[alias] = name + ".py"
+    return commands
+
+
+def commandPath(command):
+    """ Path of the script of a command (or of a script name, with or without .py), None if there is none. """
+    fileName = commands().get(command[:-len(".py")] if command.endswith(".py") else command)
+    return os.path.join(SCRIPTS_DIR, fileName) if fileName is not None else None
@@ -24,6 +24,7 @@
 # **************************************************************************
 
 from math import *
+import numpy as np
 
 def euler_from_matrix(matrix):
     """converts a matrix to Eulers - as in Relion euler.cpp"""
@@ -76,6 +77,28 @@ def euler_from_matrix_np(matrix):
     return rot, tilt, psi
 
 
+def eulers_from_matrices(matrices):
+    """converts an array of matrices (n, 3, 3) to arrays of Eulers - as euler_from_matrix"""
+    FLT_EPSILON = 1.19209e-07
+    m = matrices
+
+    abs_sb = np.sqrt(m[:, 0, 2] * m[:, 0, 2] + m[:, 1, 2] * m[:, 1, 2])
+    psi = np.arctan2(m[:, 1, 2], -m[:, 0, 2])
+    rot = np.arctan2(m[:, 2, 1], m[:, 2, 0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sign_sb = np.where(np.abs(np.sin(psi)) < FLT_EPSILON, np.sign(-m[:, 0, 2] / np.cos(psi)),
+                           np.where(np.sin(psi) > 0, np.sign(m[:, 1, 2]), -np.sign(m[:, 1, 2])))
+    tilt = np.arctan2(sign_sb * abs_sb, m[:, 2, 2])
+
+    # rotations about the z axis only
+    gimbal = abs_sb <= 16 * FLT_EPSILON
+    up = m[:, 2, 2] > 0
+    rot[gimbal] = 0
+    tilt[gimbal] = np.where(up, 0, pi)[gimbal]
+    psi[gimbal] = np.where(up, np.arctan2(-m[:, 1, 0], m[:, 0, 0]), np.arctan2(m[:, 1, 0], -m[:, 0, 0]))[gimbal]
+    return rot, tilt, psi
+
+
 def euler_from_vector(vector):
     """converts a view vector to Eulers that describe a rotation taking the reference vector [0,0,1] on the vector"""
 
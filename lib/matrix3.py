@@ -126,6 +126,23 @@ def matrix_from_euler_np(rot, tilt, psi):
 
     return matrix
 
+def matrices_from_eulers(rot, tilt, psi):
+    """Create the rotation matrices (array of shape (n, 3, 3)) from arrays of Euler angles in ZYZ convention"""
+    matrices = np.empty((len(rot), 3, 3))
+
+    matrices[:, 0, 0] = np.cos(psi) * np.cos(tilt) * np.cos(rot) - np.sin(psi) * np.sin(rot)
+    matrices[:, 0, 1] = np.cos(psi) * np.cos(tilt) * np.sin(rot) + np.sin(psi) * np.cos(rot)
+    matrices[:, 0, 2] = -np.cos(psi) * np.sin(tilt)
+    matrices[:, 1, 0] = -np.sin(psi) * np.cos(tilt) * np.cos(rot) - np.cos(psi) * np.sin(rot)
+    matrices[:, 1, 1] = -np.sin(psi) * np.cos(tilt) * np.sin(rot) + np.cos(psi) * np.cos(rot)
+    matrices[:, 1, 2] = np.sin(psi) * np.sin(tilt)
+    matrices[:, 2, 0] = np.sin(tilt) * np.cos(rot)
+    matrices[:, 2, 1] = np.sin(tilt) * np.sin(rot)
+    matrices[:, 2, 2] = np.cos(tilt)
+
+    return matrices
+
+
 def matrix_from_euler_zxz(rot, tilt, psi):
     """create a rotation matrix from three Euler anges in ZXZ convention"""
     a = [0, 0, 0, 0, 0, 0, 0, 0, 0]
@@ -240,6 +257,15 @@ def matrix_multiply(m1, m2):
     return Matrix3(a)
 
 
+def matrices_multiply(m1, m2):
+    """Multiply each matrix of an array of shape (n, 3, 3) by the Matrix3 m2, the same sums as matrix_multiply"""
+    m3 = np.empty(m1.shape)
+    for i in range(3):
+        for j in range(3):
+            m3[:, i, j] = m1[:, i, 0] * m2.m[0][j] + m1[:, i, 1] * m2.m[1][j] + m1[:, i, 2] * m2.m[2][j]
+    return m3
+
+
 def matrix_transpose(m1):
     m2 = Matrix3(None)
     m2.m[0][0] = m1.m[0][0]
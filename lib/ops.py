@@ -0,0 +1,251 @@
+"""
+Core operations of the star scripts as functions on the tables of a MetaData (see
+Table), usable without the command line, e.g. in one process running many of them:
+
+    md = MetaData("run_data.star")
+    particles = ops.selectValues(md.data_particles, "rlnAngleTilt", "<", 90)
+    particles = ops.rotateParticles(particles, 90, 0, 0)
+    md.setData("data_particles", particles)
+
+The functions do not print and do not change their input table, they return a new
+table with copies of the rows. The scripts are thin wrappers around them, the streamed
+scripts call them on the chunks of rows read (see MetaData.iterRows chunkSize).
+"""
+
+import math
+import operator
+from math import radians, sqrt, acos, atan2
+
+import numpy as np
+
+from metadata import GroupBy, whereLabels, whereMask
+from .euler import eulers_from_matrices
+from .matrix3 import matrix_from_euler, matrices_from_eulers, matrices_multiply, matrix_transpose
+
+MATH_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": operator.pow,
+    "abs": operator.abs,
+    "mod": operator.mod,
+}
+
+# labels of the Euler angles of the particles
+EULER_LABELS = ["rlnAngleRot", "rlnAngleTilt", "rlnAnglePsi"]
+
+# rotation of the flipped reconstruction along each axis
+FLIP_ROTATIONS = {"x": (180, 180, 0), "y": (0, -180, 0)}
+
+
+def rowMask(table, where):
+    """ Bool mask of the rows fulfilling all the conditions (see MetaData.read where). """
+    columns = dict((label, table.column(label)) for label in whereLabels(where))
+    return whereMask(columns, len(table), where)
+
+
+def select(table, where):
+    """ Rows fulfilling all the conditions (see MetaData.read where). """
+    return table.take(rowMask(table, where))
+
+
+def selectValues(table, label, op, value):
+    """ Rows where the value of label compares to value with op ("=", "!=", "<", "<=", ">", ">="). """
+    return select(table, [(label, op, value)])
+
+
+def selectRange(table, label, low, high):
+    """ Rows where low <= value of label <= high. """
+    return select(table, [(label, "range", (low, high))])
+
+
+def percentile(values, percent):
+    """
+    Percentile of a sorted list of values, percent is from 0.0 to 1.0.
+    Values between two list items are interpolated, None for an empty list.
+    """
+    if not values:
+        return None
+    k = (len(values) - 1) * percent
+    f = math.floor(k)
+    c = math.ceil(k)
+    if f == c:
+        return values[int(k)]
+    return values[int(f)] * (c - k) + values[int(c)] * (k - f)
+
+
+def labelPercentile(table, label, percent):
+    """ Percentile (percent from 0.0 to 1.0) of the values of label in the table. """
+    return percentile(sorted(table.column(label).tolist()), percent)
+
+
+def orientationConditions(rot=(-180, 180), tilt=(0, 180), psi=(-180, 180)):
+    """ Row conditions (see MetaData.read where) of the (min, max) ranges of the Euler angles. """
+    return [("rlnAngleRot", "range", tuple(rot)),
+            ("rlnAngleTilt", "range", tuple(tilt)),
+            ("rlnAnglePsi", "range", tuple(psi))]
+
+
+def selectOrientations(table, rot=(-180, 180), tilt=(0, 180), psi=(-180, 180)):
+    """ Particles with the Euler angles in the (min, max) ranges. """
+    return select(table, orientationConditions(rot, tilt, psi))
+
+
+def _floatValues(table, label, positions):
+    # values of the label in the rows at positions, floats in double precision as in python
+    values = np.asarray(table.column(label))[positions]
+    return values.astype(np.float64) if values.dtype.kind == "f" else values
+
+
+def mathValues(table, label, op, value, mask=None):
+    """
+    Apply the math operation op ("+", "-", "*", "/", "^", "abs", "=", "mod", "remainder")
+    with value to label in the rows of mask (all the rows by default). A value starting
+    with "rln" is the name of a label, its value in each row is used.
+    """
+    out = table.take(np.arange(len(table)))
+    positions = np.flatnonzero(mask) if mask is not None else np.arange(len(out))
+    current = _floatValues(out, label, positions)
+    operand = _floatValues(out, value, positions) if isinstance(value, str) and value.startswith("rln") else value
+    # division by zero, overflows and complex results raise FloatingPointError, as the python operators raise
+    with np.errstate(divide="raise", over="raise", invalid="raise"):
+        if op == "abs":
+            values = np.abs(current)
+        elif op == "=":
+            values = operand
+        elif op == "remainder":
+            values = current - operand * np.trunc(current.astype(np.float64) / operand).astype(np.int64)
+        elif op == "^" and current.dtype.kind in "iub" and np.any(np.asarray(operand) < 0):
+            # negative powers of ints are floats, as in python
+            values = np.power(current.astype(np.float64), operand)
+        else:
+            values = MATH_OPERATORS[op](current, operand)
+    out.setValues(label, positions, values)
+    return out
+
+
+def classMask(table, classNumbers):
+    """ Bool mask of the particles of the classes, -1 in classNumbers selects all of them. """
+    if -1 in classNumbers:
+        return np.ones(len(table), dtype=bool)
+    return rowMask(table, [("rlnClassNumber", "in", set(classNumbers))])
+
+
+def _eulerFromVector(vector):
+    # Eulers of the rotation taking the reference vector [0,0,1] on the vector
+    x, y, z = vector
+    distance = sqrt(x ** 2 + y ** 2 + z ** 2)
+    try:
+        x *= 1 / distance
+        y *= 1 / distance
+        z *= 1 / distance
+    except ZeroDivisionError:
+        x = 0
+        y = 0
+        z = 0
+
+    if abs(x) < 0.00001 and abs(y) < 0.00001:
+        rot = radians(0.00)
+    else:
+        rot = atan2(y, x)
+    return rot, acos(z), 0
+
+
+def _rotateEulers(table, positions, matrix_rotation):
+    # matrices of the particles at positions multiplied by the transposed rotation, their new Euler angles (rad)
+    matrices = matrices_from_eulers(*[np.radians(_floatValues(table, label, positions)) for label in EULER_LABELS])
+    return matrices, eulers_from_matrices(matrices_multiply(matrices, matrix_transpose(matrix_rotation)))
+
+
+def rotateParticles(table, rot, tilt, psi, x=0, y=0, z=0, classNumbers=(-1,), version="3.1"):
+    """
+    Rotate the particles by the Euler angles (degrees) and shift their origins by (x, y, z)
+    (in Angstrom for RELION 3.1 files, in px for 3.0). Only the particles of the classes
+    are rotated (see classMask).
+    """
+    out = table.take(np.arange(len(table)))
+    positions = np.flatnonzero(classMask(out, classNumbers))
+    matrix_rotation = matrix_from_euler(radians(rot), radians(tilt), radians(psi))
+    shiftRot, shiftTilt, shiftPsi = _eulerFromVector([x, y, z])
+    matrix_shift = matrix_from_euler(shiftRot, shiftTilt, shiftPsi)
+    d = sqrt(x ** 2 + y ** 2 + z ** 2)
+    originLabels = ["rlnOriginXAngst", "rlnOriginYAngst", "rlnOriginZAngst"] if version == "3.1" \
+        else ["rlnOriginX", "rlnOriginY", "rlnOriginZ"]
+
+    matrices, eulers = _rotateEulers(out, positions, matrix_rotation)
+    for label, angles in zip(EULER_LABELS, eulers):
+        out.setValues(label, positions, np.degrees(angles))
+
+    m_shift = matrices_multiply(matrices, matrix_transpose(matrix_shift))
+    for axis, originLabel in enumerate(originLabels):
+        if axis == 2 and originLabel not in out.columns:
+            continue
+        # the particles without the origin keep it unset
+        present = ~out.missing[originLabel][positions] if originLabel in out.missing else slice(None)
+        out.setValues(originLabel, positions[present],
+                      -m_shift[present, axis, 2] * d + _floatValues(out, originLabel, positions[present]))
+    return out
+
+
+def flipParticles(table, axis="x", classNumbers=(-1,)):
+    """
+    Transform the Euler angles of the particles of the classes (see classMask) to give the
+    reconstruction flipped along axis "x" (same as --invert_hand of relion_image_handler) or "y".
+    """
+    out = table.take(np.arange(len(table)))
+    positions = np.flatnonzero(classMask(out, classNumbers))
+    matrix_rotation = matrix_from_euler(*[radians(angle) for angle in FLIP_ROTATIONS[axis]])
+
+    matrices, (rotNew, tiltNew, psiNew) = _rotateEulers(out, positions, matrix_rotation)
+    out.setValues("rlnAngleRot", positions, np.degrees(rotNew))
+    out.setValues("rlnAngleTilt", positions, np.degrees(tiltNew))
+    out.setValues("rlnAnglePsi", positions, np.degrees(psiNew) - 180)
+    return out
+
+
+def selectMaxProbSymCopies(table, label="rlnImageName", groups=None):
+    """
+    Of the symmetry copies of each particle (same value of label), the one with the greatest
+    rlnMaxValueProbDistribution. groups is the GroupBy of the table on label if already made.
+    """
+    groups = groups if groups is not None else GroupBy(table, label)
+    return table.take(groups.argmax("rlnMaxValueProbDistribution"))
+
+
+def selectRandomSymCopies(table, label="rlnImageName", rng=None, groups=None):
+    """
+    Randomly picked one of the symmetry copies of each particle (same value of label).
+    groups is the GroupBy of the table on label if already made.
+    """
+    groups = groups if groups is not None else GroupBy(table, label)
+    return table.take(groups.random(rng))
+
+
+def _orientationCells(table):
+    # heatmap cell of 1 deg of rlnAngleTilt and rlnAngleRot (shifted to (0, 360]) of each particle
+    rot = np.asarray(table.column("rlnAngleRot"), dtype=np.float64)
+    tilt = np.asarray(table.column("rlnAngleTilt"), dtype=np.float64)
+    rot = np.where(rot <= 0, rot + 360, rot)
+    return tilt.astype(np.int64) * 361 + rot.astype(np.int64)
+
+
+def orientationCounts(table):
+    """ Particle counts of the occupied 1 deg (rlnAngleTilt, rlnAngleRot) orientations, ordered by tilt and rot. """
+    cells, counts = np.unique(_orientationCells(table), return_counts=True)
+    return counts
+
+
+def removePreferredOrientation(table, maxCount):
+    """
+    Keep at most maxCount particles per 1 deg (rlnAngleTilt, rlnAngleRot) orientation, the ones
+    with the greatest rlnMaxValueProbDistribution. The particles are ordered by orientation.
+    """
+    cells, codes, counts = np.unique(_orientationCells(table), return_inverse=True, return_counts=True)
+    overrepresented = counts[codes] > maxCount
+    prob = np.asarray(table.column("rlnMaxValueProbDistribution"), dtype=np.float64)
+    # by orientation, the overrepresented ones by decreasing probability, ties in the table order
+    order = np.lexsort((np.where(overrepresented, -prob, 0), codes))
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    return table.take(order[rank < maxCount])
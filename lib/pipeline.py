@@ -0,0 +1,70 @@
+import os
+import runpy
+import sys
+from contextlib import redirect_stdout
+
+from metadata import PipeStage
+from lib.commands import SCRIPTS_DIR, commandPath
+
+
+def splitStages(args):
+    """ Split a command line into the argument lists of the stages, separated by "|". """
+    stages = [[]]
+    for arg in args:
+        if arg == "|":
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    if not all(stages):
+        raise ValueError("Empty stage in the pipeline.")
+    return stages
+
+
+def scriptPath(name):
+    """ Path of a star script given by its name or its starpy.py command (e.g. stats for stats_star.py). """
+    path = commandPath(name)
+    if path is None:
+        raise ValueError("Star script '%s' not found in %s." % (name, SCRIPTS_DIR))
+    return path
+
+
+def runStage(path, args, input=None, capture=True):
+    """
+    Run a star script in this process as if called from the command line with args.
+    Its STDIN is the MetaData input (the real STDIN if None), with capture the MetaData
+    written to STDOUT is returned instead of being written.
+    """
+    argv = sys.argv
+    sys.argv = [path] + list(args)
+    try:
+        with PipeStage(input, capture) as stage:
+            if capture:
+                # messages printed by the script would otherwise end up in the star file of the last stage
+                with redirect_stdout(sys.stderr):
+                    runpy.run_path(path, run_name="__main__")
+            else:
+                runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError("%s %s exited with code %s." % (os.path.basename(path), " ".join(args), e.code))
+    finally:
+        sys.argv = argv
+    return stage.output
+
+
+def runPipeline(stages, input=None, capture=False):
+    """
+    Run star scripts as a pipeline in one process. stages are lists of a script name and
+    its arguments, the same as in a shell pipeline. The MetaData written to STDOUT by a stage
+    is read from STDIN by the next one without formatting and parsing the text in between.
+    input is the MetaData read from STDIN by the first stage (the real STDIN if None). With
+    capture, the MetaData written to STDOUT by the last stage is returned instead of written.
+    """
+    paths = [scriptPath(stage[0]) for stage in stages]
+    piped = input
+    for n, (path, stage) in enumerate(zip(paths, stages), start=1):
+        last = n == len(stages)
+        piped = runStage(path, stage[1:], piped, capture or not last)
+        if piped is None and not last:
+            raise RuntimeError("Stage %d (%s) did not write a star file to STDOUT." % (n, stage[0]))
+    return piped
@@ -0,0 +1,181 @@
+import base64
+import io
+import json
+import os
+import socket
+import sys
+from stat import S_ISDIR
+
+# name of the Unix socket of the server in the private directory of the user, STARPY_SOCKET overrides it
+SOCKET_NAME = "starpy.sock"
+# memory of the star files kept parsed by the server
+DEFAULT_MEMORY_MB = 4096
+
+
+def socketPath(path=None):
+    """ Socket given, $STARPY_SOCKET or starpy.sock in $XDG_RUNTIME_DIR (/tmp/starpy-<uid> without it). """
+    return path or os.environ.get("STARPY_SOCKET") or _defaultSocket()
+
+
+def _defaultSocket():
+    runtimeDir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtimeDir or not os.path.isdir(runtimeDir):
+        runtimeDir = os.path.join("/tmp", "starpy-%d" % os.getuid())
+    return os.path.join(runtimeDir, SOCKET_NAME)
+
+
+def _privateDir(path):
+    """ Create the directory of the socket of the server if needed, only accessible by the user. """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError("%s is not a directory accessible only by you, remove it or use another --socket."
+                           % path)
+
+
+def _checkOwner(path):
+    """ Raises PermissionError if the socket belongs to another user. """
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError("%s belongs to another user" % path)
+
+
+def _send(connection, message):
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+
+def _receive(connection):
+    data = bytearray()
+    while not data.endswith(b"\n"):
+        chunk = connection.recv(1 << 20)
+        if not chunk:
+            break
+        data.extend(chunk)
+    return json.loads(data.decode()) if data else None
+
+
+def request(message, path=None):
+    """ Send a request to the server and return its response. Raises OSError if no server is listening. """
+    path = socketPath(path)
+    _checkOwner(path)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+        _send(connection, message)
+        return _receive(connection)
+    finally:
+        connection.close()
+
+
+def _runCommand(store, message):
+    """ Run a star script on behalf of a client, returns its output, messages and exit code. """
+    import runpy
+    import traceback
+    from contextlib import redirect_stdout, redirect_stderr
+    from lib.pipeline import scriptPath
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    argv, stdin, cwd = sys.argv, sys.stdin, os.getcwd()
+    code = 0
+    try:
+        path = scriptPath(message["argv"][0])
+        os.chdir(message["cwd"])
+        sys.argv = [path] + message["argv"][1:]
+        # STDIN of the client, base64-encoded bytes
+        sys.stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(base64.b64decode(message.get("stdin", "")))))
+        with store, redirect_stdout(stdout), redirect_stderr(stderr):
+            runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if not isinstance(e.code, (int, type(None))):
+            stderr.write("%s\n" % e.code)
+    except ValueError as e:
+        stderr.write("Error: %s\n" % e)
+        code = 1
+    except Exception:
+        stderr.write(traceback.format_exc())
+        code = 1
+    finally:
+        sys.argv, sys.stdin = argv, stdin
+        os.chdir(cwd)
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+
+def _status(store):
+    lines = ["%-8s %10s  %s" % ("tokens", "MB", "star file")]
+    for (path, keepTokens, dtypes), (stat, md, size) in reversed(store.entries.items()):
+        lines.append("%-8s %10.1f  %s" % (keepTokens, size / 1e6, path))
+    lines.append("%d files, %.1f of %.1f MB, %d reads, %d from memory." % (
+        len(store.entries), store.size() / 1e6, store.maxBytes / 1e6, store.loads + store.hits, store.hits))
+    return {"stdout": "\n".join(lines) + "\n", "stderr": "", "code": 0}
+
+
+def serve(path=None, memoryMB=DEFAULT_MEMORY_MB, log=None):
+    """
+    Answer the requests of the clients on a Unix socket until a stop request. A request runs a
+    star script in this process with the star files it reads kept parsed in memory (see TableStore),
+    so repeated requests on the same files do not parse them again. Requests are run one at a time.
+    """
+    from metadata import TableStore
+
+    path = socketPath(path)
+    if path == _defaultSocket():
+        _privateDir(os.path.dirname(path))
+    if os.path.lexists(path):
+        if os.lstat(path).st_uid != os.getuid():
+            raise RuntimeError("%s belongs to another user." % path)
+        try:
+            request({"status": True}, path)
+            raise RuntimeError("A starpy server is already listening on %s." % path)
+        except OSError:
+            pass
+        try:
+            # left over by a server that did not stop
+            os.remove(path)
+        except OSError as e:
+            raise RuntimeError("Cannot remove the socket %s left over by another server: %s" % (path, e))
+
+    store = TableStore(memoryMB * 1024 * 1024)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # the socket is created accessible only by the user
+    umask = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen()
+    try:
+        while True:
+            connection, address = listener.accept()
+            with connection:
+                try:
+                    message = _receive(connection)
+                    if message is None:
+                        continue
+                    if not isinstance(message, dict):
+                        raise ValueError("Request is not a JSON object.")
+                    if message.get("stop"):
+                        _send(connection, {"stdout": "", "stderr": "starpy server stopped.\n", "code": 0})
+                        break
+                    if message.get("status"):
+                        _send(connection, _status(store))
+                        continue
+                    if not message.get("argv") or not isinstance(message["argv"], list):
+                        raise ValueError("Request without a command.")
+                    response = _runCommand(store, message)
+                    if log is not None:
+                        log("%s (exit %d)" % (" ".join(message["argv"]), response["code"]))
+                    _send(connection, response)
+                except Exception as e:
+                    # a client that went away or sent a broken request, the server keeps running
+                    if log is not None:
+                        log("Request failed: %s" % e)
+                    try:
+                        _send(connection, {"stdout": "", "stderr": "Error: %s\n" % e, "code": 1})
+                    except OSError:
+                        pass
+    finally:
+        listener.close()
+        os.remove(path)
@@ -6,7 +6,6 @@ from metadata import MetaData
 from metadata import LABELS
 import argparse
 from argparse import RawTextHelpFormatter
-import cexprtk
 
 
 class MathExpStar:
@@ -114,6 +113,8 @@ class MathExpStar:
         return True
 
     def validate_expressions(self, expression, sel_expression):
+        import cexprtk
+
         try:
             if expression:
                 cexprtk.check_expression(expression)
@@ -124,6 +125,8 @@ class MathExpStar:
             self.error(f"Invalid expression syntax: {str(e)}")
 
     def mathParticles(self, particles, res_lb, expression, sel_expression, expression_vars, selection_vars, defalut_value):
+        import cexprtk
+
         counter = 0
         for particle in particles:
             selection_variables = {}
@@ -2,11 +2,11 @@
 
 import os
 import sys
-import operator
-from metadata import MetaData
+from metadata import MetaData, StarWriter, WRITE_CHUNK_ROWS
 from metadata import LABELS
 import argparse
 from argparse import RawTextHelpFormatter
+from lib import ops
 
 
 class MathStar:
@@ -143,86 +143,16 @@ class MathStar:
         # muted print if the output is STDOUT
         if self.args.o != "STDOUT":
             print(message)
-    def get_particles(self, md, dataTableName):
-        particles = []
-        for particle in getattr(md, dataTableName):
-            particles.append(particle)
-        return particles
-
     def mathParticles(self, particles, atr, op_char, value, sel_op_char, sel_atr, sel_value, rangeHi, rangeLo,
                       rangeSel):
-        try:
-            # Python2
-            ops = {"+": operator.add,
-                   "-": operator.sub,
-                   "*": operator.mul,
-                   "/": operator.div,
-                   "^": operator.pow,
-                   "abs": operator.abs,
-                   "mod": operator.mod}
-        except AttributeError:
-            # Python3
-            ops = {"+": operator.add,
-                   "-": operator.sub,
-                   "*": operator.mul,
-                   "/": operator.truediv,
-                   "^": operator.pow,
-                   "abs": operator.abs,
-                   "mod": operator.mod}
-
-        sel_ops = {"=": operator.eq,
-                   "!=": operator.ne,
-                   ">": operator.gt,
-                   ">=": operator.ge,
-                   "<": operator.lt,
-                   "<=": operator.le}
-
-        if (op_char != "=") and (op_char != "remainder"): op_func = ops[op_char]
-
-        sel_op_func = sel_ops[sel_op_char]
-
-        newParticles = []
-        mathCounter = 0
-
-        def doMathOnParticle(selectedParticle, atr, value):
-            if type(value) == str:
-                if value.startswith("rln"):
-                    value = getattr(selectedParticle, value)
-
-            if op_char == "abs":
-                setattr(selectedParticle, atr, op_func(getattr(selectedParticle, atr)))
-            elif op_char == "=":
-                setattr(selectedParticle, atr, value)
-            elif op_char == "remainder":
-                setattr(selectedParticle, atr,
-                        getattr(selectedParticle, atr) - value * int(float(getattr(selectedParticle, atr)) / value))
-            else:
-                setattr(selectedParticle, atr, op_func(getattr(selectedParticle, atr), value))
-            newParticles.append(selectedParticle)
-
-        while len(particles) > 0:
-            selectedParticle = particles.pop(0)
-            if sel_atr != "None":
-                if not rangeSel:
-                    if sel_op_func(getattr(selectedParticle, sel_atr), sel_value):
-                        mathCounter += 1
-                        doMathOnParticle(selectedParticle, atr, value)
-                    else:
-                        newParticles.append(selectedParticle)
-                else:
-                    if ((getattr(selectedParticle, sel_atr) >= rangeLo) and (
-                            getattr(selectedParticle, sel_atr) <= rangeHi)):
-                        mathCounter += 1
-                        doMathOnParticle(selectedParticle, atr, value)
-                    else:
-                        newParticles.append(selectedParticle)
+        mask = None
+        if sel_atr != "None":
+            if rangeSel:
+                mask = ops.rowMask(particles, [(sel_atr, "range", (rangeLo, rangeHi))])
             else:
-                mathCounter += 1
-                doMathOnParticle(selectedParticle, atr, value)
-
-        self.mprint("%s particles out of %s were affected by math operation." % (mathCounter, str(len(newParticles))))
-
-        return newParticles
+                mask = ops.rowMask(particles, [(sel_atr, sel_op_char, sel_value)])
+        self.mathCounter += len(particles) if mask is None else int(mask.sum())
+        return ops.mathValues(particles, atr, op_char, value, mask)
 
     def main(self):
         self.define_parser()
@@ -237,10 +167,11 @@ class MathStar:
             else:
                 self.mprint("Performing math on particles where %s is %s %s." % (args.sellb, args.selop, selValue))
 
-        md = MetaData(args.i)
-
         dataTableName = args.data
 
+        md = MetaData()
+        tables = md.iterRows(args.i, dataTableName, chunkSize=WRITE_CHUNK_ROWS, keepTokens=True)
+
         if md.version == "3.1":
             ilabels = md.getLabels(dataTableName)
         else:
@@ -250,24 +181,22 @@ class MathStar:
         if args.lb not in ilabels:
             self.error("No label " + args.lb + " found in Input file.")
 
-        new_particles = []
-
-        particles = self.get_particles(md, dataTableName)
-        new_particles.extend(
-            self.mathParticles(particles, args.lb, args.op, compValue, args.selop, args.sellb, selValue, rangeHi,
-                               rangeLo, rangeSel))
-
         if md.version == "3.1":
-            mdOut = md.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-        mdOut.addData(dataTableName, new_particles)
-        mdOut.write(args.o)
+        self.mathCounter = 0
+        particleCounter = 0
+        with StarWriter(args.o, mdOut, dataTableName, source=md) as writer:
+            for particles in tables:
+                particleCounter += len(particles)
+                writer.writeRows(self.mathParticles(particles, args.lb, args.op, compValue, args.selop, args.sellb,
+                                                    selValue, rangeHi, rangeLo, rangeSel))
+        self.mprint("%s particles out of %s were affected by math operation." % (self.mathCounter, particleCounter))
 
         self.mprint("New star file %s created. Have fun!" % args.o)
 
@@ -20,7 +20,13 @@
 # **************************************************************************
 
 import sys
+import os
+import io
 import ast
+import re
+import operator
+import pickle
+import importlib
 
 try:
     # Python 2
@@ -28,8 +34,11 @@ try:
 except ImportError:
     # Python 3
     izip = zip
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import copy
+import itertools
+import keyword
+import numpy as np
 
 LABELS = {
     'rlnComment': str,  # A metadata comment (This is treated in a special way)
@@ -650,12 +659,72 @@ LABELS = {
     'rlnResult': float,  # General result label to store float values
 }
 
+# size of the blocks in which the data rows of loop tables are read and converted
+READ_CHUNK_BYTES = 1 << 21
+
+# end of the data rows of a loop: an empty line or a line starting a new table, loop, label or comment
+_LOOP_END = re.compile(rb"\n[ \t\r]*(?:\n|data_|loop_|_|#)")
+
+# binary cache of parsed star files: directory suffix, format version and
+# number of bytes from the beginning of the file hashed into the cache key
+CACHE_SUFFIX = ".starpy-cache"
+CACHE_VERSION = 3
+CACHE_HEADER_BYTES = 1 << 16
+
+# modules of the codecs of compressed star files per file name suffix (output) and per magic bytes (input),
+# imported only when needed like the other modules not used by every script (see _module)
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "lzma"}
+# gzip level of written files, the default of the gzip tool (the maximum 9 of the module is several times slower)
+GZIP_COMPRESSLEVEL = 6
+
+# comparison operators of the row conditions (see MetaData.read)
+WHERE_OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# loop data rows parsed in parallel (see MetaData.read workers): byte ranges read and parsed by
+# the worker processes, ranges read ahead per worker, and the least number of bytes of loop rows
+# (up to the end of an uncompressed file) worth starting the worker processes
+WORKER_RANGE_BYTES = 1 << 24
+WORKER_BLOCKS = 2
+WORKER_MIN_BYTES = 1 << 26
+
+# number of loop rows formatted (and written) at once
+WRITE_CHUNK_ROWS = 1 << 14
+
+# formats of the values in loop rows and non-loop tables per label type
+LOOP_FORMATS = {float: "%f \t", int: "%d \t", bool: "%d \t"}
+VALUE_FORMATS = {float: "_%-35s%15f\n", int: "_%-35s%15d\n", bool: "_%-35s%15d\n"}
+
+# labels of images in stacks (slice@stack path), stored as slice numbers and stack paths (see StackColumn)
+STACK_LABELS = {"rlnImageName", "rlnImageOriginalName", "rlnReconstructImageName"}
+
+# number of values of a str label used to infer its type when reading a star file
+TYPE_SAMPLE_SIZE = 1000
+
+# numpy dtypes of the table columns per label type, other types (str, list) are stored as objects
+COLUMN_DTYPES = {
+    float: np.float64,
+    int: np.int64,
+    bool: np.bool_,
+}
+
 
 class Label:
     def __init__(self, labelName):
         self.name = labelName
         # Get the type from the LABELS dict, assume str by default
         self.type = LABELS.get(labelName, str)
+        # set once the type of a str label was inferred from the values read
+        self.inferred = False
+        # numpy dtype of the column if the label holds float values (see MetaData.read)
+        self.floatDtype = np.dtype(np.float64)
 
     def __str__(self):
         return self.name
@@ -664,6 +733,18 @@ class Label:
         return self.name == str(other)
 
 
+def _formatList(value):
+    """ Format list values the way they are stored in star files. """
+    return "[" + ",".join(map(str, value)) + "]"
+
+
+def _formatValue(labelType, value):
+    """ Text of a single value of a loop row, the same as written by StarWriter. """
+    if isinstance(value, list):
+        return _formatList(value)
+    return LOOP_FORMATS.get(labelType, "%s \t")[:-len(" \t")] % value
+
+
 class Item:
     """
     General class to store data from a row. (e.g. Particle, Micrograph, etc)
@@ -686,83 +767,2056 @@ class Item:
         """
         value = getattr(self, key)
         if isinstance(value, list):
-            return "[" + ",".join(map(str, value)) + "]"
+            return _formatList(value)
         return value
 
+
+class Record:
+    """
+    Base of the compact row records generated from the labels of a table (see
+    _recordClass). The values are stored in __slots__ instead of a per-row dict,
+    values of other labels can still be set and go to a dict created on demand.
+    """
+    __slots__ = ()
+    # label names of the slots, set by _recordClass
+    _labels = ()
+
+    copyValues = Item.copyValues
+    clone = Item.clone
+    __getitem__ = Item.__getitem__
+
+    def __reduce__(self):
+        return _makeRecord, (self._labels, _recordValues(self))
+
+
+# row record classes per tuple of label names
+_RECORD_CLASSES = {}
+
+# marks labels without a value in a row record
+_UNSET = object()
+
+
+def _recordClass(labelNames):
+    """
+    Record class with slots for the label names, shared by the tables with the same
+    labels. Falls back to Item for names not usable as slots.
+    """
+    labelNames = tuple(labelNames)
+    recordClass = _RECORD_CLASSES.get(labelNames)
+    if recordClass is None:
+        if all(name.isidentifier() and not keyword.iskeyword(name) and not name.startswith("_")
+               for name in labelNames):
+            recordClass = type("Record", (Record,), {"__slots__": labelNames + ("__dict__",),
+                                                      "_labels": labelNames})
+        else:
+            recordClass = Item
+        _RECORD_CLASSES[labelNames] = recordClass
+    return recordClass
+
+
+def _makeRecord(labelNames, values):
+    """ Rebuild a row record (used by copy and pickle). """
+    record = _recordClass(labelNames)()
+    for name, value in values.items():
+        setattr(record, name, value)
+    return record
+
+
+def _recordValues(item):
+    """ Dict of the values set in a row record or an Item. """
+    if isinstance(item, Record):
+        values = OrderedDict()
+        for name in item._labels:
+            value = getattr(item, name, _UNSET)
+            if value is not _UNSET:
+                values[name] = value
+        values.update(item.__dict__)
+        return values
+    return vars(item)
+
+
+def _literalType(value):
+    """ Type of the python literal in the value, str if it is not a literal.
+    """
+    try:
+        return type(ast.literal_eval(value))
+    except Exception:
+        return str
+
+
+def _inferType(values):
+    """
+    Infer the type of a str label from a sample of its values spread over the
+    column. Mixed types are resolved to a single one (int and float to float,
+    anything else to str) so that a column never holds values of several types.
+    """
+    step = max(1, len(values) // TYPE_SAMPLE_SIZE)
+    types = set(_literalType(value) for value in values[::step])
+    if types == {int}:
+        return int
+    if types == {float} or types == {int, float}:
+        return float
+    if types == {list}:
+        return list
+    return str
+
+
+def _cacheOption(cache):
+    """
+    Where to cache the parsed star files: True for a directory next to the star
+    file, a path of a cache directory, or False. Defaults to the STARPY_CACHE
+    environment variable ("1" for next to the star file, or a directory).
+    """
+    if cache is None:
+        cache = os.environ.get("STARPY_CACHE", "")
+        if cache in ("", "0"):
+            return False
+        if cache == "1":
+            return True
+    return cache
+
+
+def _module(name):
+    """
+    Import a module on first use. Modules needed only by some reads (compression, worker
+    processes, binary cache) are not imported at start, which keeps the start of the scripts fast.
+    """
+    return importlib.import_module(name)
+
+
+def _openInput(input_star):
+    """
+    Binary file object of a star file or STDIN. Compressed input (gzip, bz2, xz) is
+    recognized by its magic bytes and decompressed while reading.
+    """
+    if input_star == "STDIN":
+        f = sys.stdin.buffer
+        magic = f.peek(max(len(m) for m in COMPRESSION_MAGIC))
+        for prefix, codec in COMPRESSION_MAGIC.items():
+            if magic.startswith(prefix):
+                return _module(codec).open(f)
+        return f
+    with open(input_star, "rb") as f:
+        magic = f.read(max(len(m) for m in COMPRESSION_MAGIC))
+    for prefix, codec in COMPRESSION_MAGIC.items():
+        if magic.startswith(prefix):
+            return _module(codec).open(input_star, "rb")
+    return open(input_star, "rb")
+
+
+def _openOutput(output_star):
+    """ Text file object for writing a star file, compressed if the name ends with .gz, .bz2 or .xz. """
+    codec = COMPRESSION_SUFFIXES.get(os.path.splitext(output_star)[1])
+    if codec == "gzip":
+        return _module(codec).open(output_star, "wt", compresslevel=GZIP_COMPRESSLEVEL)
+    if codec is not None:
+        return _module(codec).open(output_star, "wt")
+    return open(output_star, "w")
+
+
+def _convertValue(label, value):
+    """
+    Convert a value read from the star file according to the label type.
+    """
+    if label.type == int:
+        # this is a workaround for starfile module storing ints as floats
+        return label.type(float(value))
+    elif label.type == bool:
+        # Convert string/numeric 0/1 to proper boolean values
+        if value in ('0', 0):
+            return False
+        elif value in ('1', 1):
+            return True
+        return bool(int(float(value)))
+    elif label.type == list:
+        return ast.literal_eval(value)
+    elif label.type == str:
+        #try to dynamically evaluate the type (as str is the default for unknown types)
+        try:
+            evaluated = ast.literal_eval(value)
+            label.type = type(evaluated)
+            return evaluated
+        except:
+            return label.type(value)
+    else:
+        return label.type(value)
+
+
+def _convertColumn(label, values):
+    """
+    Convert all the values (str) of a label read from the star file at once.
+    """
+    if label.type is str and not label.inferred:
+        label.type = _inferType(values)
+        label.inferred = True
+    if label.type is float:
+        try:
+            return np.array(values, dtype=label.floatDtype)
+        except ValueError:
+            pass
+    elif label.type is int or label.type is bool:
+        column = None
+        try:
+            column = np.array(values, dtype=np.int64)
+        except (ValueError, OverflowError):
+            if not label.inferred:
+                try:
+                    # this is a workaround for starfile module storing ints as floats
+                    column = np.array(values, dtype=np.float64).astype(np.int64)
+                except ValueError:
+                    pass
+        if column is not None:
+            return column.astype(bool) if label.type is bool else column
+        if label.inferred:
+            # later values of an inferred int label are not all ints, use float for the whole label
+            label.type = float
+            return _convertColumn(label, values)
+    elif label.type is list and label.inferred:
+        try:
+            return _makeColumn([ast.literal_eval(value) for value in values], object)
+        except Exception:
+            pass
+    if label.inferred:
+        # values not fitting the inferred type, keep the whole label as str (dictionary-encoded)
+        label.type = str
+        column = StackColumn.parse(values) if label.name in STACK_LABELS else None
+        return column if column is not None else Categorical.encode(values)
+    # other types (or values not fitting the type) are converted value by value
+    converted = [_convertValue(label, value) for value in values]
+    return _makeColumn(converted, _labelDtype(label))
+
+
+def whereLabels(where):
+    """ Labels used by the row conditions (see MetaData.read where). """
+    labels = set()
+    for condition in where:
+        if len(condition) == 2:
+            labels.update(condition[0])
+        else:
+            labels.add(condition[0])
+    return labels
+
+
+def whereMask(columns, size, where):
+    """
+    Bool mask of the rows fulfilling all the row conditions (see MetaData.read where),
+    columns maps the labels of the conditions (see whereLabels) to their arrays.
+    """
+    mask = np.ones(size, dtype=bool)
+    for condition in where:
+        if len(condition) == 2:
+            labels, function = condition
+            arrays = [np.asarray(columns[label]) if isinstance(columns[label], (Categorical, StackColumn))
+                      else columns[label] for label in labels]
+            mask &= np.asarray(function(*arrays), dtype=bool)
+            continue
+        label, op, value = condition
+        column = columns[label]
+        if op == "in":
+            if isinstance(column, (Categorical, StackColumn)):
+                mask &= column.isin(value)
+            elif column.dtype == object:
+                mask &= np.fromiter((v in value for v in column.tolist()), dtype=bool, count=size)
+            else:
+                mask &= np.isin(column, list(value))
+        elif op == "range":
+            low, high = value
+            mask &= (column >= low) & (column <= high)
+        else:
+            mask &= np.asarray(WHERE_OPERATORS[op](column, value), dtype=bool)
+    return mask
+
+
+# MetaData and arguments of _parseLoopChunk in the worker processes parsing loop rows
+_worker = None
+
+
+def _initWorker(dataTableName, labels, labelNames, where, keepTokens):
+    """ Set up a worker process parsing the rows of a loop table. """
+    global _worker
+    md = MetaData()
+    md.addDataTable(dataTableName, True)
+    getattr(md, dataTableName + "_labels").update(labels)
+    _worker = md, (dataTableName, labelNames, where, keepTokens)
+
+
+def _readLoopRange(path, start, end, loopStart):
+    """
+    Data lines of a loop starting in the byte range [start, end) of an uncompressed star file
+    with the loop rows starting at loopStart. Returns them with the offset of the end of the
+    loop (a line which is not a data row, or the end of the file) if it is in the range, else None.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        first = start
+        if start > loopStart:
+            # the lines starting in the range follow a newline at start - 1 or later
+            f.seek(start - 1)
+            data = f.read(end - start + 1)
+            newline = data.find(b"\n")
+            first = start + newline if newline >= 0 else end
+            data = data[newline + 1:] if newline >= 0 else b""
+        else:
+            f.seek(start)
+            data = f.read(end - start)
+        if data and not data.endswith(b"\n"):
+            # complete the last line of the range
+            data += f.readline()
+        match = _LOOP_END.search(b"\n" + data)
+        if match:
+            return data[:match.start()], first + match.start()
+        return data, size if first + len(data) >= size else None
+
+
+def _parseWorkerRange(byteRange):
+    """ Parse the loop data rows of a byte range in a worker process, returned with the end of the loop and the label types. """
+    md, (dataTableName, labelNames, where, keepTokens) = _worker
+    data, loopEnd = _readLoopRange(*byteRange)
+    chunk = md._parseLoopChunk(dataTableName, data, labelNames, where, keepTokens) if data else None
+    labels = getattr(md, dataTableName + "_labels").values()
+    return chunk, loopEnd, [(label.name, label.type, label.inferred) for label in labels]
+
+
+def _mergeType(type1, type2):
+    """ Type able to hold the values of a label converted to both types. """
+    if type1 is type2:
+        return type1
+    if set((type1, type2)) <= set((int, float)):
+        return float
+    return str
+
+
+def _columnDtype(labelType):
+    """ Numpy dtype used to store the values of a label of the given type.
+    """
+    return COLUMN_DTYPES.get(labelType, object)
+
+
+def _labelDtype(label):
+    """ Numpy dtype used to store the values of a label (its float dtype for float labels). """
+    return label.floatDtype if label.type is float else _columnDtype(label.type)
+
+
+def _valueDtype(value):
+    """ Numpy dtype of a single python value (object for non-numerical ones).
+    """
+    if isinstance(value, (bool, int, float, np.number, np.bool_)):
+        return np.asarray(value).dtype
+    return np.dtype(object)
+
+
+def _makeColumn(values, dtype):
+    """
+    Build a column array from a list of python values. Falls back to an object
+    column if the values do not fit the requested dtype (e.g. str in a float label).
+    """
+    if dtype is not object:
+        try:
+            return np.array(values, dtype=dtype)
+        except (ValueError, TypeError, OverflowError):
+            pass
+    column = np.array(values, dtype=object)
+    if column.ndim != 1:
+        # list values would otherwise create a 2D array
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+    return column
+
+
+def _emptyColumn(size, dtype):
+    """ Column of a given size and dtype used for rows without a value.
+    """
+    if np.dtype(dtype) == object:
+        return np.full(size, None, dtype=object)
+    return np.zeros(size, dtype=dtype)
+
+
+def _promoteColumn(column, value):
+    """ Return the column converted to a dtype able to hold the value.
+    """
+    if isinstance(column, StackColumn):
+        if column.fits(value):
+            return column
+        column = Categorical.encode(column.tolist())
+    if isinstance(column, Categorical):
+        try:
+            hash(value)
+            return column
+        except TypeError:
+            return np.asarray(column)
+    kind = column.dtype.kind
+    if kind == "O":
+        return column
+    if isinstance(value, (bool, int, float, np.number, np.bool_)):
+        if kind == "f":
+            return column
+        dtype = np.result_type(column.dtype, value)
+    else:
+        dtype = np.dtype(object)
+    if dtype != column.dtype:
+        column = column.astype(dtype)
+    return column
+
+
+def _columnArrays(column):
+    """ Numpy arrays holding the values of a column. """
+    if isinstance(column, Categorical):
+        return [column.codes, column.values]
+    if isinstance(column, StackColumn):
+        return [column.slices, column.stacks.codes, column.stacks.values]
+    return [column]
+
+
+def _writable(column):
+    """ The column, or a copy of it if it is read-only (shared by Table views, see Table.view). """
+    if all(array.flags.writeable for array in _columnArrays(column)):
+        return column
+    return column.copy()
+
+
+def _concatColumns(parts):
+    """ Concatenate column parts, promoting to a common dtype (object if needed).
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if all(isinstance(part, StackColumn) for part in parts) and len(set(part.width for part in parts)) == 1:
+        return StackColumn.concatenate(parts)
+    if any(isinstance(part, (Categorical, StackColumn)) for part in parts):
+        try:
+            return Categorical.concatenate(parts)
+        except TypeError:
+            # unhashable values (e.g. lists) in the other parts
+            pass
+    if any(part.dtype == object for part in parts):
+        return np.concatenate([part.astype(object) for part in parts])
+    return np.concatenate(parts)
+
+
+class Categorical:
+    """
+    Dictionary-encoded column of str labels: an int32 code per row indexing the array
+    of the distinct values. Used by Table as a 1D object array (indexing, item, tolist,
+    comparisons), comparisons and "in" tests are evaluated once per distinct value and
+    spread to the rows by their codes.
+    """
+    dtype = np.dtype(object)
+    ndim = 1
+
+    def __init__(self, codes, values, lookup=None):
+        self.codes = codes
+        self.values = values
+        # value -> code, built on demand
+        self._lookup = lookup
+
+    @classmethod
+    def encode(cls, values):
+        """ Encode a list of (hashable) values. """
+        lookup = {}
+        codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values), dtype=np.int32,
+                            count=len(values))
+        return cls(codes, _makeColumn(list(lookup), object), lookup)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """ Concatenate Categorical (or array) parts into a Categorical with the union of the values. """
+        lookup = {}
+        codes = []
+        for part in parts:
+            if not isinstance(part, Categorical):
+                part = Categorical.encode(part.tolist())
+            mapping = np.array([lookup.setdefault(value, len(lookup)) for value in part.values.tolist()],
+                               dtype=np.int32)
+            codes.append(mapping[part.codes] if len(mapping) else part.codes)
+        return cls(np.concatenate(codes), _makeColumn(list(lookup), object), lookup)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.values[self.codes[index]]
+        # the codes are copied (also for slices) so that new values set in one part do not reach the other
+        return Categorical(self.codes[index].copy(), self.values, self._lookup)
+
+    def __setitem__(self, index, value):
+        if self._lookup is None:
+            self._lookup = dict((v, code) for code, v in enumerate(self.values.tolist()))
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values = _makeColumn(self.values.tolist() + [value], object)
+            self._lookup = dict(self._lookup)
+            self._lookup[value] = code
+        self.codes[index] = code
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.values[self.codes]
+        return array if dtype is None else array.astype(dtype)
+
+    def __getstate__(self):
+        return self.codes, self.values
+
+    def __setstate__(self, state):
+        self.codes, self.values = state
+        self._lookup = None
+
+    def item(self, index):
+        return self.values[self.codes[index]]
+
+    def tolist(self):
+        return self.values[self.codes].tolist()
+
+    def copy(self):
+        return Categorical(self.codes.copy(), self.values, self._lookup)
+
+    def astype(self, dtype):
+        return np.asarray(self).astype(dtype)
+
+    def isin(self, values):
+        """ Bool array of the rows with a value in values. """
+        return np.array([value in values for value in self.values.tolist()], dtype=bool)[self.codes]
+
+    def _compare(self, op, other):
+        if np.ndim(other):
+            return op(np.asarray(self), other)
+        return np.asarray(op(self.values, other), dtype=bool)[self.codes]
+
+    def __eq__(self, other):
+        return self._compare(operator.eq, other)
+
+    def __ne__(self, other):
+        return self._compare(operator.ne, other)
+
+    def __lt__(self, other):
+        return self._compare(operator.lt, other)
+
+    def __le__(self, other):
+        return self._compare(operator.le, other)
+
+    def __gt__(self, other):
+        return self._compare(operator.gt, other)
+
+    def __ge__(self, other):
+        return self._compare(operator.ge, other)
+
+    __hash__ = None
+
+
+class StackColumn:
+    """
+    Column of image names (slice@stack path) decoded into the slice numbers (int64)
+    and the dictionary-encoded stack paths (Categorical). The names are joined again
+    (slice numbers zero-padded to the width read) when accessed or written.
+    Used by Table as a 1D object array of the names, like Categorical.
+    """
+    dtype = np.dtype(object)
+    ndim = 1
+
+    def __init__(self, slices, stacks, width):
+        self.slices = slices
+        self.stacks = stacks
+        # number of digits of the slice numbers
+        self.width = width
+
+    @classmethod
+    def parse(cls, values):
+        """ Decode a list of image names, None if they do not all have slice numbers of the same width. """
+        try:
+            split = [value.split("@", 1) for value in values]
+            slices = [item[0] for item in split]
+            stacks = [item[1] for item in split]
+        except (AttributeError, IndexError):
+            return None
+        widths = set(map(len, slices))
+        if len(widths) != 1 or not all(map(str.isdigit, slices)):
+            return None
+        return cls(np.array(slices, dtype=np.int64), Categorical.encode(stacks), widths.pop())
+
+    @classmethod
+    def concatenate(cls, parts):
+        """ Concatenate StackColumns of the same width. """
+        return cls(np.concatenate([part.slices for part in parts]),
+                   Categorical.concatenate([part.stacks for part in parts]), parts[0].width)
+
+    def fits(self, value):
+        """ True if the image name can be stored without changing the width of the slice numbers. """
+        if not isinstance(value, str):
+            return False
+        index, sep, stack = value.partition("@")
+        return bool(sep) and len(index) == self.width and index.isdigit()
+
+    @property
+    def shape(self):
+        return self.slices.shape
+
+    def __len__(self):
+        return len(self.slices)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return "%0*d@%s" % (self.width, self.slices[index], self.stacks[index])
+        return StackColumn(self.slices[index], self.stacks[index], self.width)
+
+    def __setitem__(self, index, value):
+        # values not fitting are handled by _promoteColumn
+        number, sep, stack = value.partition("@")
+        self.slices[index] = int(number)
+        self.stacks[index] = stack
+
+    def __array__(self, dtype=None, copy=None):
+        array = _makeColumn(self.tolist(), object)
+        return array if dtype is None else array.astype(dtype)
+
+    def item(self, index):
+        return self[index]
+
+    def tolist(self):
+        return ["%0*d@%s" % (self.width, index, stack)
+                for index, stack in zip(self.slices.tolist(), self.stacks.tolist())]
+
+    def copy(self):
+        return StackColumn(self.slices.copy(), self.stacks.copy(), self.width)
+
+    def astype(self, dtype):
+        return np.asarray(self).astype(dtype)
+
+    def isin(self, values):
+        """ Bool array of the rows with a value in values. """
+        return np.array([value in values for value in self.tolist()], dtype=bool)
+
+    def __eq__(self, other):
+        if self.fits(other):
+            # compare the slice numbers and the stack codes instead of the names
+            number, sep, stack = other.partition("@")
+            return (self.slices == int(number)) & (self.stacks == stack)
+        return np.asarray(self) == other
+
+    def __ne__(self, other):
+        return ~self.__eq__(other) if self.fits(other) else np.asarray(self) != other
+
+    def __lt__(self, other):
+        return np.asarray(self) < other
+
+    def __le__(self, other):
+        return np.asarray(self) <= other
+
+    def __gt__(self, other):
+        return np.asarray(self) > other
+
+    def __ge__(self, other):
+        return np.asarray(self) >= other
+
+    __hash__ = None
+
+
+class Row:
+    """
+    Lazy view of a single row of a Table. Attribute access reads and writes the
+    column arrays, so existing code using particle.rlnAngleRot keeps working.
+    """
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._table.getValue(self._index, name)
+
+    def __setattr__(self, name, value):
+        self._table.setValue(self._index, name, value)
+
+    def __delattr__(self, name):
+        self._table.delValue(self._index, name)
+
+    def __eq__(self, other):
+        return isinstance(other, Row) and self._table is other._table and self._index == other._index
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._table), self._index))
+
+    def copyValues(self, other, *labels):
+        """
+        Copy the values form other object.
+        """
+        for l in labels:
+            setattr(self, l, getattr(other, l))
+
+    def clone(self):
+        """ Detached copy of the row values. """
+        return self._table.getItem(self._index)
+
+    def __copy__(self):
+        return self.clone()
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.clone(), memo)
+
+    def __getitem__(self, key):
+        """
+        Used for formatting with %(key)s in format strings.
+        Handles special formatting for lists.
+        """
+        value = getattr(self, key)
+        if isinstance(value, list):
+            return _formatList(value)
+        return value
+
+
+class Table:
+    """
+    Columnar storage of the rows of a data table. Every label lives in one typed
+    numpy array (float64, int64, bool or object for str and list values), str labels
+    read from star files are dictionary-encoded (see Categorical). Rows are handed
+    out as lazy Row views over those arrays.
+    Rows appended from other tables (or plain Items) are kept pending and copied
+    into the columns in bulk on the next access.
+    Columns not needed when reading (see MetaData.read labels) are kept raw, as the
+    str tokens of the star file, converted on first access and written unchanged.
+    Converted raw columns keep their tokens, the tokens of the rows set later are
+    re-formatted, so the values not modified are still written as they were read.
+    Column arrays modified in place must be set back with setColumn.
+    """
+
+    def __init__(self, labels=None):
+        # OrderedDict of Label objects shared with MetaData.<table>_labels
+        self.labels = labels if labels is not None else OrderedDict()
+        self.columns = OrderedDict()
+        # label -> bool mask of the rows without a value for the label
+        self.missing = {}
+        # names of the raw columns
+        self.raw = set()
+        # label -> str tokens read from the star file of a converted raw column
+        self.tokens = {}
+        self._size = 0
+        self._pending = []
+
+    def __len__(self):
+        return self._size + len(self._pending)
+
+    def __iter__(self):
+        self._flush()
+        for index in range(self._size):
+            yield Row(self, index)
+
+    def __getitem__(self, index):
+        self._flush()
+        if isinstance(index, slice):
+            return [Row(self, i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("table index out of range")
+        return Row(self, index)
+
+    def __setitem__(self, index, item):
+        row = self[index]
+        for name, value in self._itemValues(item):
+            setattr(row, name, value)
+
+    def __delitem__(self, index):
+        self._flush()
+        keep = np.ones(self._size, dtype=bool)
+        keep[index] = False
+        for name in self.columns:
+            self.columns[name] = self.columns[name][keep]
+        for name in self.missing:
+            self.missing[name] = self.missing[name][keep]
+        for name in self.tokens:
+            self.tokens[name] = self.tokens[name][keep]
+        self._size = int(keep.sum())
+
+    def __deepcopy__(self, memo):
+        self._flush()
+        other = Table.__new__(Table)
+        memo[id(self)] = other
+        other.labels = copy.deepcopy(self.labels, memo)
+        other.columns = OrderedDict((name, column.copy()) for name, column in self.columns.items())
+        other.missing = dict((name, mask.copy()) for name, mask in self.missing.items())
+        other.raw = set(self.raw)
+        other.tokens = dict((name, tokens.copy()) for name, tokens in self.tokens.items())
+        other._size = self._size
+        other._pending = []
+        return other
+
+    def append(self, item):
+        self._pending.append(item)
+
+    def extend(self, items):
+        self._pending.extend(items)
+
+    def take(self, positions):
+        """ New table with copies of the rows at positions (array of row positions or bool mask), in their order. """
+        self._flush()
+        positions = np.asarray(positions)
+        if positions.dtype != bool:
+            positions = positions.astype(np.int64)
+        other = Table(self.labels)
+        for name, column in self.columns.items():
+            other.columns[name] = column[positions]
+        for name, mask in self.missing.items():
+            if mask[positions].any():
+                other.missing[name] = mask[positions]
+        for name, tokens in self.tokens.items():
+            other.tokens[name] = tokens[positions]
+        other.raw = set(self.raw)
+        other._size = int(positions.sum()) if positions.dtype == bool else len(positions)
+        return other
+
+    def view(self):
+        """
+        Table sharing the column arrays of this one without copying them. The arrays are made
+        read-only, setting values in either table copies the arrays of the label first.
+        """
+        self._flush()
+        for arrays in (self.columns, self.missing, self.tokens):
+            for column in arrays.values():
+                for array in _columnArrays(column):
+                    array.flags.writeable = False
+        other = Table(copy.deepcopy(self.labels))
+        other.columns = OrderedDict(self.columns)
+        other.missing = dict(self.missing)
+        other.raw = set(self.raw)
+        other.tokens = dict(self.tokens)
+        other._size = self._size
+        return other
+
+    def column(self, name):
+        """ Numpy array with the values of the label (a Categorical for str labels read from a star file). """
+        self._flush()
+        if name in self.raw:
+            self._convertRaw(name)
+        return self.columns[name]
+
+    def setColumn(self, name, values):
+        """ Set all the values of a label at once from an array (or a list). """
+        self._flush()
+        column = values if isinstance(values, (np.ndarray, Categorical, StackColumn)) \
+            else _makeColumn(list(values), object)
+        if len(column) != self._size:
+            raise ValueError("Column %s has %d values, table has %d rows." % (name, len(column), self._size))
+        self.columns[name] = column
+        self.missing.pop(name, None)
+        self.raw.discard(name)
+        self.tokens.pop(name, None)
+
+    def fillColumn(self, name, value):
+        """ Set the same value for the label in all the rows. """
+        self._flush()
+        label = self.labels.get(name)
+        dtype = _labelDtype(label) if label is not None else _valueDtype(value)
+        column = _promoteColumn(_emptyColumn(self._size, dtype), value)
+        if isinstance(value, list):
+            # assigning a list to a slice would spread its elements over the rows
+            for i in range(self._size):
+                column[i] = value
+        else:
+            column[:] = value
+        self.columns[name] = column
+        self.missing.pop(name, None)
+        self.raw.discard(name)
+        self.tokens.pop(name, None)
+
+    def imageStack(self, name="rlnImageName"):
+        """
+        Slice numbers (int array) and stack paths (Categorical) of the image names
+        (slice@stack path) of a label, e.g. to group the particles by their stacks.
+        """
+        column = self.column(name)
+        if not isinstance(column, StackColumn):
+            split = [value.split("@", 1) for value in column.tolist()]
+            column = StackColumn(np.array([int(item[0]) for item in split], dtype=np.int64),
+                                 Categorical.encode([item[1] for item in split]), None)
+        return column.slices, column.stacks
+
+    def removeColumn(self, name):
+        self._flush()
+        self.columns.pop(name, None)
+        self.missing.pop(name, None)
+        self.raw.discard(name)
+        self.tokens.pop(name, None)
+
+    def getValue(self, index, name):
+        if self._pending:
+            self._flush()
+        if name in self.raw:
+            self._convertRaw(name)
+        try:
+            column = self.columns[name]
+        except KeyError:
+            raise AttributeError(name)
+        mask = self.missing.get(name)
+        if mask is not None and mask[index]:
+            raise AttributeError(name)
+        return column.item(index)
+
+    def setValue(self, index, name, value):
+        if self._pending:
+            self._flush()
+        if name in self.raw:
+            self._convertRaw(name)
+        column = self.columns.get(name)
+        if column is None:
+            label = self.labels.get(name)
+            if label is not None:
+                dtype = _labelDtype(label)
+            elif name in LABELS:
+                dtype = _columnDtype(LABELS[name])
+            else:
+                dtype = _valueDtype(value)
+            column = _emptyColumn(self._size, dtype)
+            self.missing[name] = np.ones(self._size, dtype=bool)
+        promoted = _writable(_promoteColumn(column, value))
+        if promoted is not column:
+            self.columns[name] = column = promoted
+        elif name not in self.columns:
+            self.columns[name] = column
+        column[index] = value
+        tokens = self.tokens.get(name)
+        if tokens is not None:
+            tokens = self.tokens[name] = _writable(tokens)
+            tokens[index] = _formatValue((self.labels.get(name) or Label(name)).type, value)
+        mask = self.missing.get(name)
+        if mask is not None:
+            mask = self.missing[name] = _writable(mask)
+            mask[index] = False
+            if not mask.any():
+                del self.missing[name]
+
+    def setValues(self, name, positions, values):
+        """
+        Set the values of a label in the rows at positions (array of row positions or bool mask)
+        at once, values is a numerical array with a value per position (or a single number).
+        As with setValue, the column is promoted if needed and the tokens of the rows are re-formatted.
+        """
+        self._flush()
+        positions = np.asarray(positions)
+        positions = np.flatnonzero(positions) if positions.dtype == bool else positions.astype(np.int64)
+        values = np.broadcast_to(np.asarray(values), positions.shape)
+        if name in self.raw:
+            self._convertRaw(name)
+        column = self.columns.get(name)
+        if not isinstance(column, (np.ndarray, type(None))) or values.dtype.kind not in "biuf":
+            # str columns and values set one by one
+            for position, value in zip(positions.tolist(), values.tolist()):
+                self.setValue(position, name, value)
+            return
+        if column is None:
+            label = self.labels.get(name)
+            if label is not None:
+                dtype = _labelDtype(label)
+            elif name in LABELS:
+                dtype = _columnDtype(LABELS[name])
+            else:
+                dtype = values.dtype
+            column = _emptyColumn(self._size, dtype)
+            self.missing[name] = np.ones(self._size, dtype=bool)
+        elif column.dtype.kind not in "fO" and np.result_type(column.dtype, values.dtype) != column.dtype:
+            column = column.astype(np.result_type(column.dtype, values.dtype))
+        column = self.columns[name] = _writable(column)
+        column[positions] = values
+        tokens = self.tokens.get(name)
+        if tokens is not None:
+            labelType = (self.labels.get(name) or Label(name)).type
+            tokens = self.tokens[name] = _writable(tokens)
+            tokens[positions] = [_formatValue(labelType, value) for value in values.tolist()]
+        mask = self.missing.get(name)
+        if mask is not None:
+            mask = self.missing[name] = _writable(mask)
+            mask[positions] = False
+            if not mask.any():
+                del self.missing[name]
+
+    def delValue(self, index, name):
+        self._flush()
+        if name not in self.columns:
+            raise AttributeError(name)
+        mask = self.missing[name] = _writable(self.missing.get(name, np.zeros(self._size, dtype=bool)))
+        mask[index] = True
+
+    def getItem(self, index):
+        """ Detached row record (see Record) with the values of a row. """
+        self._flush()
+        self._convertRaw(*self.raw)
+        item = _recordClass(self.columns)()
+        for name, column in self.columns.items():
+            mask = self.missing.get(name)
+            if mask is None or not mask[index]:
+                setattr(item, name, column.item(index))
+        return item
+
+    def _itemValues(self, item):
+        if isinstance(item, Row):
+            table = item._table
+            table._flush()
+            table._convertRaw(*table.raw)
+            for name, column in table.columns.items():
+                mask = table.missing.get(name)
+                if mask is None or not mask[item._index]:
+                    yield name, column.item(item._index)
+        else:
+            for name, value in _recordValues(item).items():
+                yield name, value
+
+    def _convertRaw(self, *names):
+        """ Convert raw columns to the types of their labels. """
+        for name in names:
+            label = self.labels.get(name) or Label(name)
+            self.tokens[name] = self.columns[name]
+            self.columns[name] = _convertColumn(label, self.columns[name].tolist())
+            self.raw.discard(name)
+
+    def _segmentColumns(self, source, rows):
+        """ Columns (with missing masks and tokens) for a run of rows coming from the same source. """
+        columns = OrderedDict()
+        missing = {}
+        tokens = {}
+        if source is not None:
+            # rows of another table: a single take per column
+            source._flush()
+            indices = np.array(rows, dtype=np.int64)
+            for name, column in source.columns.items():
+                columns[name] = column[indices]
+                if name in source.missing:
+                    missing[name] = source.missing[name][indices]
+                if name in source.tokens:
+                    tokens[name] = source.tokens[name][indices]
+        else:
+            # detached row records and plain Item objects
+            values = OrderedDict()
+            for i, item in enumerate(rows):
+                for name, value in _recordValues(item).items():
+                    values.setdefault(name, {})[i] = value
+            for name, byRow in values.items():
+                label = self.labels.get(name)
+                if label is not None:
+                    dtype = _labelDtype(label)
+                elif name in LABELS:
+                    dtype = _columnDtype(LABELS[name])
+                else:
+                    dtype = object
+                if len(byRow) == len(rows):
+                    columns[name] = _makeColumn([byRow[i] for i in range(len(rows))], dtype)
+                else:
+                    fill = 0 if dtype is not object else None
+                    columns[name] = _makeColumn([byRow.get(i, fill) for i in range(len(rows))], dtype)
+                    missing[name] = np.array([i not in byRow for i in range(len(rows))], dtype=bool)
+        return columns, missing, tokens
+
+    def _flush(self):
+        """ Copy the pending rows into the column arrays. """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        # split the pending rows into runs coming from the same table (or Items)
+        segments = []
+        for item in pending:
+            if isinstance(item, Row):
+                source, row = item._table, item._index
+                if source is self:
+                    # a row of this very table, copy its values
+                    source, row = None, self.getItem(item._index)
+            else:
+                source, row = None, item
+            if segments and segments[-1][0] is source:
+                segments[-1][1].append(row)
+            else:
+                segments.append((source, [row]))
+
+        # columns stay raw only if they are raw in all the rows, others are converted first
+        raw = set(self.raw) if self._size else None
+        for source, rows in segments:
+            sourceRaw = source.raw if source is not None else set()
+            raw = set(sourceRaw) if raw is None else raw & sourceRaw
+        self._convertRaw(*(self.raw - raw))
+        for source, rows in segments:
+            if source is not None:
+                source._convertRaw(*(source.raw - raw))
+
+        parts = [(self._size, self.columns, self.missing, self.tokens)]
+        for source, rows in segments:
+            columns, missing, tokens = self._segmentColumns(source, rows)
+            parts.append((len(rows), columns, missing, tokens))
+
+        names = []
+        for size, columns, missing, tokens in parts:
+            for name in columns:
+                if name not in names:
+                    names.append(name)
+
+        newColumns = OrderedDict()
+        newMissing = {}
+        newTokens = {}
+        for name in names:
+            dtype = next(columns[name].dtype for size, columns, missing, tokens in parts if name in columns)
+            columnParts = []
+            maskParts = []
+            for size, columns, missing, tokens in parts:
+                if name in columns:
+                    columnParts.append(columns[name])
+                    maskParts.append(missing.get(name))
+                else:
+                    columnParts.append(_emptyColumn(size, dtype))
+                    maskParts.append(np.ones(size, dtype=bool))
+            newColumns[name] = _concatColumns(columnParts)
+            if any(mask is not None for mask in maskParts):
+                mask = np.concatenate([m if m is not None else np.zeros(size, dtype=bool)
+                                       for m, (size, columns, missing, tokens) in zip(maskParts, parts)])
+                if mask.any():
+                    newMissing[name] = mask
+            # the tokens are kept only if all the rows have them
+            tokenParts = [tokens.get(name) for size, columns, missing, tokens in parts if size]
+            if all(part is not None for part in tokenParts):
+                newTokens[name] = np.concatenate(tokenParts)
+
+        self.columns = newColumns
+        self.missing = newMissing
+        self.tokens = newTokens
+        self.raw = raw & set(newColumns)
+        self._size = sum(size for size, columns, missing, tokens in parts)
+
+
+class Index:
+    """
+    Hash index of the rows of a table on one or more labels (composite keys are tuples
+    of the values). Every distinct key gets a code, the row positions are kept grouped
+    by code, so all the positions of a key are a slice of one array. Lookups of the keys
+    of all the rows of another table return arrays of positions (see lookup and join).
+    The index is not updated when the table changes.
+    """
+
+    def __init__(self, table, labels):
+        self.labels = [labels] if isinstance(labels, str) else list(labels)
+        # key -> code
+        self.codes = {}
+        rowCodes = self._keyCodes(table, self.labels, self.codes.setdefault)
+        # positions of the rows grouped by key code, the rows of code k are order[starts[k]:starts[k] + counts[k]]
+        self.order = np.argsort(rowCodes, kind="stable")
+        self.counts = np.bincount(rowCodes, minlength=len(self.codes))
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def _keyCodes(self, table, labels, getCode):
+        """ Codes of the keys of all the rows of a table, getCode(key, default) maps one key. """
+        labels = labels or self.labels
+        columns = [table.column(label) for label in ([labels] if isinstance(labels, str) else labels)]
+        if len(columns) == 1 and isinstance(columns[0], Categorical):
+            # map the distinct values only
+            column = columns[0]
+            mapping = np.array([getCode(value, len(self.codes)) for value in column.values.tolist()], dtype=np.int64)
+            return mapping[column.codes] if len(mapping) else np.zeros(0, dtype=np.int64)
+        if len(columns) == 1:
+            keys = columns[0].tolist()
+        else:
+            keys = zip(*[column.tolist() for column in columns])
+        return np.fromiter((getCode(key, len(self.codes)) for key in keys), dtype=np.int64, count=len(table))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, key):
+        return key in self.codes
+
+    def positions(self, key):
+        """ Positions of the rows with the key (value, or tuple of values for composite keys). """
+        code = self.codes.get(key)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.order[self.starts[code]:self.starts[code] + self.counts[code]]
+
+    def lookup(self, table, labels=None, last=False):
+        """
+        Position of the first (or last) indexed row matching each row of table, -1 for no match.
+        labels are the key labels in table, by default the labels of the index.
+        """
+        codes = self._keyCodes(table, labels, lambda key, default: self.codes.get(key, -1))
+        found = codes >= 0
+        positions = np.full(len(codes), -1, dtype=np.int64)
+        starts = self.starts[codes[found]]
+        if last:
+            starts = starts + self.counts[codes[found]] - 1
+        positions[found] = self.order[starts]
+        return positions
+
+    def join(self, table, labels=None):
+        """
+        All the matching pairs of rows (inner join): arrays of the row positions in table
+        and of the matching indexed rows, ordered by the rows of table.
+        """
+        codes = self._keyCodes(table, labels, lambda key, default: self.codes.get(key, -1))
+        rows = np.flatnonzero(codes >= 0)
+        counts = self.counts[codes[rows]]
+        starts = np.repeat(self.starts[codes[rows]] - (np.cumsum(counts) - counts), counts)
+        return np.repeat(rows, counts), self.order[starts + np.arange(len(starts))]
+
+
+class GroupBy(Index):
+    """
+    Groups of the rows of a table with the same key (see Index), in the order of the first
+    row of each group, the rows of a group keep their order in the table. The aggregations
+    return one value (or row position) per group, aligned with keys.
+    """
+
+    def __init__(self, table, labels):
+        Index.__init__(self, table, labels)
+        self.table = table
+        self.keys = list(self.codes)
+
+    def __iter__(self):
+        """ Yield the key and the row positions of each group. """
+        for key, start, count in zip(self.keys, self.starts.tolist(), self.counts.tolist()):
+            yield key, self.order[start:start + count]
+
+    def groupCodes(self):
+        """ Group code of each row of the table. """
+        codes = np.empty(len(self.order), dtype=np.int64)
+        codes[self.order] = np.repeat(np.arange(len(self.keys)), self.counts)
+        return codes
+
+    def _sorted(self, label):
+        # values of the label with the rows grouped
+        return np.asarray(self.table.column(label))[self.order]
+
+    def count(self):
+        return self.counts
+
+    def min(self, label):
+        return np.minimum.reduceat(self._sorted(label), self.starts) if len(self) else np.zeros(0)
+
+    def max(self, label):
+        return np.maximum.reduceat(self._sorted(label), self.starts) if len(self) else np.zeros(0)
+
+    def mean(self, label):
+        if not len(self):
+            return np.zeros(0)
+        return np.add.reduceat(self._sorted(label).astype(np.float64), self.starts) / self.counts
+
+    def first(self):
+        """ Position of the first row of each group. """
+        return self.order[self.starts]
+
+    def argmax(self, label):
+        """ Position of the row with the greatest value of the label in each group (the first one on ties). """
+        values = np.asarray(self.table.column(label))
+        # stable sort by group, then by decreasing value
+        order = np.lexsort((-values, self.groupCodes()))
+        return order[self.starts]
+
+    def random(self, rng=None):
+        """ Position of a randomly picked row of each group. """
+        rng = rng or np.random.default_rng()
+        return self.order[self.starts + (rng.random(len(self)) * self.counts).astype(np.int64)]
+
+
+class _StarFileReader:
+    """
+    Binary line reader of a star file. The data rows of loops are read in large
+    blocks, the bytes read past the end of a loop are pushed back for the next readline.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = b""
+
+    def readline(self):
+        if self.buffer:
+            end = self.buffer.find(b"\n") + 1
+            if end:
+                line, self.buffer = self.buffer[:end], self.buffer[end:]
+                return line
+            line, self.buffer = self.buffer, b""
+            return line + self.f.readline()
+        return self.f.readline()
+
+    def read(self, size):
+        if self.buffer:
+            data, self.buffer = self.buffer, b""
+            return data + self.f.read(size)
+        return self.f.read(size)
+
+    def tell(self):
+        """ Byte offset of the next line to be read. """
+        return self.f.tell() - len(self.buffer)
+
+    def seek(self, offset):
+        """ Continue reading at the byte offset, e.g. after the loop rows parsed by worker processes. """
+        self.f.seek(offset)
+        self.buffer = b""
+
+    def skipBlock(self):
+        """ Skip the lines up to the next data block (or the end of the file) without parsing them. """
+        data = b"\n"
+        while True:
+            block = self.read(READ_CHUNK_BYTES)
+            data += block
+            start = data.find(b"\ndata_")
+            if start >= 0:
+                self.buffer = data[start + 1:] + self.buffer
+                return
+            if not block:
+                return
+            # keep the end of the block, the next block may start inside it
+            data = data[-len(b"\ndata_"):]
+
+    def loopChunks(self, firstLine):
+        """
+        Yield blocks of complete data lines of a loop starting with firstLine,
+        stops at the first line which is not a data row.
+        """
+        # data always starts with the newline preceding its first line so that
+        # _LOOP_END also matches a loop end on the first line of a block
+        data = b"\n" + firstLine
+        while True:
+            block = self.read(READ_CHUNK_BYTES)
+            data += block
+            end = data.rfind(b"\n") + 1 if block else len(data)
+            match = _LOOP_END.search(data, 0, end)
+            if match:
+                self.buffer = data[match.start() + 1:] + self.buffer
+                if match.start() > 0:
+                    yield data[1:match.start() + 1]
+                return
+            if not block:
+                if len(data) > 1:
+                    yield data[1:]
+                return
+            if end > 1:
+                yield data[1:end]
+            data = data[end - 1:]
+
+
+class PipeStage:
+    """
+    Stage of a pipeline of star scripts run in one process (see pipe_star.py). While a
+    stage is entered, reading STDIN takes over the tables of input (the output of the
+    previous stage) and, with capture, the MetaData written to STDOUT is kept in output
+    instead of being formatted as text.
+    """
+    current = None
+
+    def __init__(self, input=None, capture=True):
+        self.input = input
+        self.capture = capture
+        self.output = None
+
+    def __enter__(self):
+        PipeStage.current = self
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        PipeStage.current = None
+
+
+def _columnBytes(column):
+    """ Approximate memory of a column, including the str objects of object arrays. """
+    if column is None:
+        return 0
+    if isinstance(column, Categorical):
+        return column.codes.nbytes + _columnBytes(column.values)
+    if isinstance(column, StackColumn):
+        return column.slices.nbytes + _columnBytes(column.stacks)
+    if column.dtype == object:
+        return column.nbytes + sum(map(sys.getsizeof, column.tolist()))
+    return column.nbytes
+
+
+def _metaDataBytes(md):
+    """ Approximate memory of the columns of the tables of a MetaData. """
+    size = 0
+    for dataTableName in md._tableNames():
+        table = getattr(md, dataTableName)
+        table._flush()
+        for name in table.columns:
+            # raw and converted columns, the tokens kept of converted raw columns and the missing masks
+            size += _columnBytes(table.columns[name]) + _columnBytes(table.tokens.get(name)) + \
+                _columnBytes(table.missing.get(name))
+    return size
+
+
+class TableStore:
+    """
+    Star files kept parsed in memory by a long-lived process (see lib/server.py). While
+    a store is entered, reading a star file takes a view of its tables from the store
+    (see MetaData.view) instead of parsing the file, the column arrays are copied only
+    when values are set. Files are read into the store on their first use and again when
+    they change. The least recently used ones are dropped once the memory of their columns
+    exceeds maxBytes, files larger than maxBytes are not kept.
+    """
+    current = None
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        # (path, read options) -> (size and mtime of the file, MetaData, bytes), least recently used first
+        self.entries = OrderedDict()
+        self.loads = 0
+        self.hits = 0
+
+    def __enter__(self):
+        TableStore.current = self
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        TableStore.current = None
+
+    def size(self):
+        return sum(entry[2] for entry in self.entries.values())
+
+    def get(self, input_star, keepTokens=False, floatDtype=None, labelDtypes=None):
+        """ View of the MetaData of a star file (see MetaData.read for the arguments). """
+        path = os.path.abspath(input_star)
+        stat = os.stat(path)
+        dtypes = str(np.dtype(floatDtype or np.float64)), sorted((n, str(d)) for n, d in (labelDtypes or {}).items())
+        key = (path, keepTokens, str(dtypes))
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[0] != (stat.st_size, stat.st_mtime_ns):
+            entry = ((stat.st_size, stat.st_mtime_ns),) + self._load(path, keepTokens, floatDtype, labelDtypes)
+            self.loads += 1
+            if entry[2] > self.maxBytes:
+                # read for this request only
+                return entry[1]
+        else:
+            self.hits += 1
+        self.entries[key] = entry
+        while self.size() > self.maxBytes:
+            self.entries.popitem(last=False)
+        return entry[1].view()
+
+    def _load(self, path, keepTokens, floatDtype, labelDtypes):
+        current, TableStore.current = TableStore.current, None
+        try:
+            md = MetaData(path, keepTokens=keepTokens, floatDtype=floatDtype, labelDtypes=labelDtypes)
+        finally:
+            TableStore.current = current
+        return md, _metaDataBytes(md)
+
+
+class StarWriter:
+    """
+    Incremental writer of star files. Opening the writer writes the comments and
+    the tables of the MetaData (in the same order as MetaData.write) up to and
+    including dataTableName, more rows of that loop table can then be written with
+    writeRows while they are produced. close() writes the remaining tables.
+    source is the MetaData the rows are streamed from (see MetaData.iterRows), close()
+    also writes its tables that are not in md, i.e. those following the streamed table,
+    which are read only once the iteration finished.
+    The rows are formatted in bulk chunks with a format compiled per table.
+    """
+
+    def __init__(self, output_star, md, dataTableName=None, source=None):
+        self.md = md
+        self.dataTableName = dataTableName
+        self.source = source
+        # STDOUT of a pipeline stage: the MetaData is handed to the next stage instead of written
+        self._pipe = PipeStage.current if output_star == "STDOUT" and PipeStage.current is not None and \
+            PipeStage.current.capture else None
+        if self._pipe is not None:
+            self.file, self._ownFile = None, False
+        elif output_star == "STDOUT":
+            self.file, self._ownFile = sys.stdout, False
+        elif isinstance(output_star, str):
+            self.file, self._ownFile = _openOutput(output_star), True
+        else:
+            self.file, self._ownFile = output_star, False
+
+        self._written = set()
+        self._writeComments()
+        for dataTableName in md._tableNames():
+            self._writeTable(dataTableName)
+            if dataTableName == self.dataTableName:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        elif self._ownFile:
+            self.file.close()
+
+    def writeRows(self, rows):
+        """
+        Write rows at the end of the streamed loop table. rows is a Table or any
+        iterable of rows and Items (e.g. a generator), consumed in chunks.
+        """
+        if isinstance(rows, Table):
+            self._writeLoopRows(self.dataTableName, rows)
+            return
+        rows = iter(rows)
+        while True:
+            table = Table(getattr(self.md, self.dataTableName + "_labels"))
+            table.extend(itertools.islice(rows, WRITE_CHUNK_ROWS))
+            if not len(table):
+                break
+            self._writeLoopRows(self.dataTableName, table)
+
+    def close(self):
+        """
+        Write the tables following the streamed one and close the output file. The tables
+        are looked up now, so those read after the streamed one (also when md is the
+        MetaData the rows are streamed from) are written as well.
+        """
+        if self.source is not None:
+            for dataTableName in self.source._tableNames():
+                if dataTableName != self.dataTableName and not hasattr(self.md, dataTableName):
+                    for suffix in ("", "_labels", "_loop"):
+                        setattr(self.md, dataTableName + suffix, getattr(self.source, dataTableName + suffix, False))
+        for dataTableName in self.md._tableNames():
+            if dataTableName not in self._written:
+                self._writeTable(dataTableName)
+        if self._pipe is not None:
+            self._pipe.output = self.md
+        elif self._ownFile:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def _writeComments(self):
+        md = self.md
+        # Add a comment with the command line used to generate the file; do it only if it was called from command line
+        if len(sys.argv) > 1:
+            md.comments.insert(0, "# " + ' '.join(sys.argv) + "\n")
+
+        # write comments in the beginning of the file
+        md.comments = list(dict.fromkeys(md.comments))  # removes duplicates while preserving order
+        if self.file is None:
+            return
+        for comment in md.comments:
+            self.file.write(comment + "\n")
+
+    def _writeTable(self, dataTableName):
+        self._written.add(dataTableName)
+        if self.file is None:
+            # kept in the MetaData
+            return
+        md = self.md
+        loop = getattr(md, dataTableName + "_loop")
+        if md.version == "3.1":
+            self.file.write("\n\n%s\n\n" % dataTableName)
+            if loop:
+                self.file.write("loop_\n")
+        else:
+            self.file.write("\n%s\n\nloop_\n" % dataTableName)
+
+        labels = getattr(md, dataTableName + "_labels").values()
+        if loop:
+            self.file.write("".join("_%s #%d \n" % (l.name, i + 1) for i, l in enumerate(labels)))
+            self._writeLoopRows(dataTableName, getattr(md, dataTableName))
+        else:
+            row = getattr(md, dataTableName)[0]
+            for l in labels:
+                self.file.write(VALUE_FORMATS.get(l.type, "_%-35s%15s\n") % (l.name, getattr(row, l.name)))
+
+    def _writeLoopRows(self, dataTableName, table):
+        if len(table) == 0:
+            return
+        if self.file is None:
+            # rows streamed to the next pipeline stage are collected in the table
+            getattr(self.md, dataTableName).extend(table)
+            return
+        labels = getattr(self.md, dataTableName + "_labels").values()
+        table._flush()
+        # raw columns and the tokens of converted ones are written as they were read
+        text = [table.columns[l.name] if l.name in table.raw else table.tokens.get(l.name) for l in labels]
+        lineFormat = "".join("%s \t" if tokens is not None else LOOP_FORMATS.get(l.type, "%s \t")
+                             for l, tokens in zip(labels, text)) + "\n"
+        columns = [tokens if tokens is not None else table.column(l.name) for l, tokens in zip(labels, text)]
+        for start in range(0, len(table), WRITE_CHUNK_ROWS):
+            # format the rows straight from the column values
+            values = []
+            for column, tokens in zip(columns, text):
+                chunk = column[start:start + WRITE_CHUNK_ROWS].tolist()
+                if column.dtype == object and tokens is None:
+                    chunk = [_formatList(v) if isinstance(v, list) else v for v in chunk]
+                values.append(chunk)
+            self.file.write("".join([lineFormat % row for row in zip(*values)]))
+
+
 class MetaData:
     """ Class to parse Relion star files
     """
 
-    def __init__(self, input_star=None):
+    def __init__(self, input_star=None, cache=None, labels=None, where=None, tables=None, keepTokens=False,
+                 workers=None, floatDtype=None, labelDtypes=None):
         self.version = "3"
         self.comments = []
+        self._setFloatDtypes(floatDtype, labelDtypes)
         if input_star:
-            self.read(input_star)
+            self.read(input_star, cache, labels, where, tables, keepTokens, workers, floatDtype, labelDtypes)
         else:
             self.clear()
 
     def clone(self):
         return copy.deepcopy(self)
 
+    def cloneWithout(self, *dataTableNames):
+        """
+        Same as clone() followed by removeDataTable() of the given tables, but their rows
+        are never copied. Used to build the output MetaData from a large input.
+        """
+        other = MetaData.__new__(MetaData)
+        memo = {}
+        for name, value in vars(self).items():
+            if name not in dataTableNames:
+                setattr(other, name, copy.deepcopy(value, memo))
+        return other
+
+    def view(self):
+        """ MetaData with views of the tables of this one, sharing their column arrays (see Table.view). """
+        other = MetaData()
+        other.version = self.version
+        other.comments = list(self.comments)
+        for dataTableName in self._tableNames():
+            table = getattr(self, dataTableName).view()
+            setattr(other, dataTableName, table)
+            setattr(other, dataTableName + "_labels", table.labels)
+            setattr(other, dataTableName + "_loop", getattr(self, dataTableName + "_loop", False))
+        return other
+
     def clear(self):
         for attribute in dir(self):
             if "data_" in attribute and "_labels" not in attribute:
                 setattr(self, attribute + "_labels", OrderedDict())
-                setattr(self, attribute, [])
+                setattr(self, attribute, Table(getattr(self, attribute + "_labels")))
 
     def addDataTable(self, dataTableName, loop=False):
         setattr(self, dataTableName + "_labels", OrderedDict())
         setattr(self, dataTableName + "_loop", loop)
-        setattr(self, dataTableName, [])
+        setattr(self, dataTableName, Table(getattr(self, dataTableName + "_labels")))
 
     def removeDataTable(self, dataTableName):
         delattr(self, dataTableName)
 
     def _setItemValue(self, item, label, value):
-        if label.type == int:
-            # this is a workaround for starfile module storing ints as floats
-            setattr(item, label.name, label.type(float(value)))
-        elif label.type == bool:
-            # Convert string/numeric 0/1 to proper boolean values
-            if value in ('0', 0):
-                setattr(item, label.name, False)
-            elif value in ('1', 1):
-                setattr(item, label.name, True)
-        elif label.type == list:
-            setattr(item, label.name, ast.literal_eval(value))
-        elif label.type == str:
-            #try to dynamically evaluate the type (as str is the default for unknown types)
-            try:
-                setattr(item, label.name, ast.literal_eval(value))
-                label.type = type(ast.literal_eval(value))
-            except:
-                setattr(item, label.name, label.type(value))
-        else:
-            setattr(item, label.name, label.type(value))
+        setattr(item, label.name, _convertValue(label, value))
+
+    def index(self, dataTableName, labels):
+        """
+        Hash index (see Index) of the rows of a data table on a label or a list of labels
+        (composite key), e.g. md.index("data_particles", ["rlnMicrographName", "rlnCoordinateX",
+        "rlnCoordinateY"]). Reuse it for the lookups of other tables.
+        """
+        return Index(getattr(self, dataTableName), labels)
+
+    def groupBy(self, dataTableName, labels):
+        """
+        Groups (see GroupBy) of the rows of a data table with the same value of a label or
+        of a list of labels, e.g. md.groupBy("data_particles", "rlnMicrographName").first()
+        gives the position of the first particle of each micrograph.
+        """
+        return GroupBy(getattr(self, dataTableName), labels)
+
+    def toNumpy(self, dataTableName="data_particles", labels=None, structured=False):
+        """
+        Columns of a data table as an OrderedDict of label name -> numpy array (all the
+        labels by default). Numerical columns are the arrays of the table (no copy, changes
+        are seen by both, the arrays of views are read-only, see Table.view), str columns
+        are converted to object arrays. Values missing in
+        some rows are 0 (None in object arrays). With structured, the columns are copied
+        into one numpy structured array with a field per label.
+        """
+        table = getattr(self, dataTableName)
+        arrays = OrderedDict()
+        for label in labels or self.getLabels(dataTableName):
+            column = table.column(label)
+            arrays[label] = column if isinstance(column, np.ndarray) else np.asarray(column)
+        if not structured:
+            return arrays
+        values = np.empty(len(table), dtype=[(label, array.dtype) for label, array in arrays.items()])
+        for label, array in arrays.items():
+            values[label] = array
+        return values
+
+    def fromNumpy(self, dataTableName, arrays, loop=True):
+        """
+        Create (or replace) a data table with the columns of a dict of label name -> 1D array
+        (or list), or of the fields of a structured array. The arrays are used without
+        a copy, so later changes of the table values are seen in the arrays.
+        """
+        if isinstance(arrays, np.ndarray):
+            arrays = OrderedDict((name, arrays[name]) for name in arrays.dtype.names)
+        sizes = set(len(values) for values in arrays.values())
+        if len(sizes) > 1:
+            raise ValueError("Columns of table %s have different lengths %s." % (dataTableName, sorted(sizes)))
+        self.addDataTable(dataTableName, loop)
+        self.addLabels(dataTableName, list(arrays))
+        table = getattr(self, dataTableName)
+        table._size = sizes.pop() if sizes else 0
+        for name, values in arrays.items():
+            if isinstance(values, np.ndarray) and values.dtype.kind in "US":
+                # numpy strings are stored as python str values
+                values = Categorical.encode(values.tolist())
+            table.setColumn(name, values)
+        return table
+
+    def recordClass(self, dataTableName="data_particles"):
+        """
+        Compact row class (with __slots__) for the labels of a data table, the same class
+        as the detached copies of its rows. Instances can be added with addItem.
+        """
+        return _recordClass(getattr(self, dataTableName + "_labels"))
 
     def _addLabel(self, dataTableName, labelName):
-        getattr(self, dataTableName + "_labels")[labelName] = Label(labelName)
+        label = Label(labelName)
+        label.floatDtype = self.labelDtypes.get(labelName, self.floatDtype)
+        getattr(self, dataTableName + "_labels")[labelName] = label
+
+    def _setFloatDtypes(self, floatDtype, labelDtypes):
+        """ Set the dtypes of the float columns of the tables read (see read). """
+        dtypes = [np.dtype(floatDtype or np.float64)] + [np.dtype(dtype) for dtype in (labelDtypes or {}).values()]
+        if any(dtype.kind != "f" for dtype in dtypes):
+            raise ValueError("Float columns can only be stored with a float dtype (e.g. float32 or float64).")
+        self.floatDtype = dtypes[0]
+        self.labelDtypes = dict(zip(labelDtypes or {}, dtypes[1:]))
+
+    def _convertRows(self, dataTableName, rows):
+        """ Convert rows of values read from the star file into a chunk of table columns. """
+        columns = OrderedDict()
+        missing = {}
+        for i, label in enumerate(getattr(self, dataTableName + "_labels").values()):
+            present = [j for j, row in enumerate(rows) if i < len(row)]
+            converted = _convertColumn(label, [rows[j][i] for j in present])
+            if len(present) == len(rows):
+                columns[label.name] = converted
+            else:
+                columns[label.name] = _emptyColumn(len(rows), converted.dtype)
+                columns[label.name][present] = converted
+                missing[label.name] = np.ones(len(rows), dtype=bool)
+                missing[label.name][present] = False
+        return columns, missing, len(rows), set()
+
+    def _parseLoopChunk(self, dataTableName, chunk, labelNames=None, where=None, keepTokens=False):
+        """
+        Tokenize a block of loop data rows at once and convert it into a chunk of table columns.
+        Only the columns of labelNames (all if None) are converted, the others are kept raw.
+        With row conditions, the columns of the conditions are converted first and only
+        the values of the rows fulfilling them are taken from the other columns.
+        With keepTokens all the columns are kept raw.
+        """
+        text = chunk.decode()
+        tokens = text.split()
+        labels = list(getattr(self, dataTableName + "_labels").values())
+        nLabels = len(labels)
+        nRows = len(tokens) // nLabels if nLabels else 0
+        nLines = text.count("\n") + (not text.endswith("\n"))
+        if where and not whereLabels(where) <= set(label.name for label in labels):
+            # conditions are applied only to tables with all their labels
+            where = None
+        if not nLabels or len(tokens) != nRows * nLabels or nRows != nLines:
+            # rows with a different number of values, split them line by line
+            chunk = self._convertRows(dataTableName, [line.split() for line in text.splitlines() if line.strip()])
+            return self._filterChunk(chunk, where) if where else chunk
+
+        selected = None
+        whereColumns = {}
+        if where:
+            for i, label in enumerate(labels):
+                if label.name in whereLabels(where):
+                    whereColumns[label.name] = _convertColumn(label, tokens[i::nLabels])
+            mask = whereMask(whereColumns, nRows, where)
+            selected = np.flatnonzero(mask) * nLabels
+            nRows = len(selected)
 
-    def read(self, input_star):
+        columns = OrderedDict()
+        raw = set()
+        for i, label in enumerate(labels):
+            if label.name in whereColumns and not keepTokens:
+                columns[label.name] = whereColumns[label.name][mask]
+                continue
+            if selected is None:
+                values = tokens[i::nLabels]
+            else:
+                values = [tokens[j] for j in (selected + i).tolist()]
+            if not keepTokens and (labelNames is None or label.name in labelNames):
+                columns[label.name] = _convertColumn(label, values)
+            else:
+                columns[label.name] = np.array(values, dtype=object)
+                raw.add(label.name)
+        return columns, {}, nRows, raw
+
+    def _parseLoopChunks(self, dataTableName, chunks, labelNames=None, where=None, keepTokens=False):
+        """ Parse the blocks of loop data rows read from the star file. """
+        for chunk in chunks:
+            yield self._parseLoopChunk(dataTableName, chunk, labelNames, where, keepTokens)
+
+    def _workerRanges(self, input_star, f, loopStart, workers):
+        """
+        Byte ranges of the rest of an uncompressed star file from loopStart, the first row of a loop,
+        to be parsed by the worker processes. None if the input is compressed or STDIN, there are
+        not enough bytes left for the workers to be faster, or there is a single CPU.
+        """
+        if min(workers, os.cpu_count() or 1) <= 1 or input_star == "STDIN" or not isinstance(f, io.BufferedReader):
+            return None
+        size = os.fstat(f.fileno()).st_size
+        if size - loopStart < WORKER_MIN_BYTES:
+            return None
+        # the first range is parsed here, so the workers start from the label types inferred from it
+        starts = [loopStart] + list(range(loopStart + READ_CHUNK_BYTES, size, WORKER_RANGE_BYTES))
+        return [(input_star, start, min(end, size), loopStart) for start, end in zip(starts, starts[1:] + [size])]
+
+    def _parseLoopRanges(self, dataTableName, reader, ranges, workers, labelNames=None, where=None, keepTokens=False):
+        """
+        Parse the loop data rows of the byte ranges in parallel by worker processes, each of them
+        reading its ranges from the file. The first range is parsed here, the types the workers
+        fall back to are merged into the labels. At most WORKER_BLOCKS ranges per worker are read
+        ahead, the chunks are yielded in order. The reader continues at the end of the loop.
+        """
+        workers = min(workers, os.cpu_count() or 1)
+        data, loopEnd = _readLoopRange(*ranges[0])
+        if data:
+            yield self._parseLoopChunk(dataTableName, data, labelNames, where, keepTokens)
+        if loopEnd is not None:
+            reader.seek(loopEnd)
+            return
+
+        labels = getattr(self, dataTableName + "_labels")
+        multiprocessing = _module("multiprocessing")
+        if "fork" in multiprocessing.get_all_start_methods():
+            # forked workers also get row conditions with lambda functions
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        pool = context.Pool(workers, _initWorker, (dataTableName, labels, labelNames, where, keepTokens))
+        try:
+            pending = deque()
+            for byteRange in itertools.chain(ranges[1:], [None]):
+                if byteRange is not None:
+                    pending.append(pool.apply_async(_parseWorkerRange, (byteRange,)))
+                while pending and (byteRange is None or len(pending) >= workers * WORKER_BLOCKS):
+                    chunk, loopEnd, types = pending.popleft().get()
+                    for name, labelType, inferred in types:
+                        label = labels[name]
+                        label.type = _mergeType(label.type, labelType)
+                        label.inferred = label.inferred or inferred
+                    if chunk is not None:
+                        yield chunk
+                    if loopEnd is not None:
+                        # the ranges after the end of the loop are not rows of this table
+                        reader.seek(loopEnd)
+                        return
+        finally:
+            pool.terminate()
+
+    def _filterChunk(self, chunk, where):
+        """ Keep only the rows of a chunk of table columns fulfilling the conditions. """
+        columns, missing, size, raw = chunk
+        mask = whereMask(columns, size, where)
+        columns = OrderedDict((name, column[mask]) for name, column in columns.items())
+        missing = dict((name, rows[mask]) for name, rows in missing.items())
+        return columns, missing, int(mask.sum()), raw
+
+    def _setTableChunks(self, dataTableName, chunks):
+        """ Concatenate the column chunks of a table read from the star file. """
+        table = getattr(self, dataTableName)
+        if not chunks:
+            # a loop with labels but no rows, empty columns of the types of the labels
+            for name, label in getattr(self, dataTableName + "_labels").items():
+                table.columns[name] = _emptyColumn(0, _labelDtype(label))
+            table._size = 0
+            return
+        for name, label in getattr(self, dataTableName + "_labels").items():
+            parts = [columns[name] for columns, missing, size, raw in chunks]
+            if all(name in raw for columns, missing, size, raw in chunks):
+                table.raw.add(name)
+            else:
+                parts = [_convertColumn(label, part.tolist()) if name in raw else part
+                         for part, (columns, missing, size, raw) in zip(parts, chunks)]
+            if label.inferred and label.type is str:
+                # chunks converted before a later one made the label fall back to str
+                parts = [part if part.dtype == object else _makeColumn([str(value) for value in part.tolist()], object)
+                         for part in parts]
+            table.columns[name] = _concatColumns(parts)
+            if any(name in missing for columns, missing, size, raw in chunks):
+                table.missing[name] = np.concatenate([missing.get(name, np.zeros(size, dtype=bool))
+                                                      for columns, missing, size, raw in chunks])
+        table._size = sum(size for columns, missing, size, raw in chunks)
+
+    def _chunkTables(self, dataTableName, chunk, chunkSize=None, tokens=None):
+        """
+        Tables of at most chunkSize rows (views) with the columns of a chunk read from the star file
+        (and the tokens of converted raw columns).
+        """
+        columns, missing, size, raw = chunk
+        step = chunkSize or max(size, 1)
+        for start in range(0, size, step):
+            table = Table(getattr(self, dataTableName + "_labels"))
+            for name, column in columns.items():
+                table.columns[name] = column[start:start + step]
+            for name, text in (tokens or {}).items():
+                table.tokens[name] = text[start:start + step]
+            for name, mask in missing.items():
+                if mask[start:start + step].any():
+                    table.missing[name] = mask[start:start + step]
+            table.raw = set(raw)
+            table._size = min(step, size - start)
+            yield table
+
+    def iterRows(self, input_star, dataTableName="data_particles", chunkSize=None, cache=None, labels=None,
+                 where=None, keepTokens=False, workers=None, floatDtype=None, labelDtypes=None):
+        """
+        Stream the rows of a loop table of the star file without storing the whole table.
+        The star file is read up to the first rows of the table at once, so the version,
+        labels and preceding tables (e.g. data_optics) are available before iterating.
+        The rows of RELION 3.0 files (single data_ table) are streamed for any table name.
+        Yields Row views, or Tables of at most chunkSize rows if chunkSize is given.
+        Tables following the streamed one are read once the iteration finishes.
+        With a cache (see read), the rows are handed out from the cached columns.
+        labels and where restrict the columns converted and the rows read, keepTokens
+        keeps the text of the values, workers parse the rows in parallel and floatDtype
+        and labelDtypes set the dtypes of float columns (see read).
+        """
+        tables = self._read(input_star, dataTableName, chunkSize, cache, labels, where, keepTokens=keepTokens,
+                            workers=workers, floatDtype=floatDtype, labelDtypes=labelDtypes)
+        first = next(tables, None)
+        if first is None:
+            return iter([])
+        tables = itertools.chain([first], tables)
+        if chunkSize:
+            return tables
+        return (row for table in tables for row in table)
+
+    def read(self, input_star, cache=None, labels=None, where=None, tables=None, keepTokens=False, workers=None,
+             floatDtype=None, labelDtypes=None):
+        """
+        Read the star file. With cache (True, a directory or the STARPY_CACHE
+        environment variable) the parsed columns are saved to a binary cache
+        and later reads of the unchanged file memory-map them instead of parsing.
+        If labels are given, only the columns of these labels are converted while
+        reading loop tables, the others are kept raw (see Table).
+        where is a list of row conditions, only the rows of loop tables fulfilling all
+        of them are read (tables without all the labels of the conditions are read whole):
+            (label, op, value) with op one of "=", "!=", "<", "<=", ">", ">=",
+            (label, "range", (low, high)) for low <= value <= high,
+            (label, "in", values) for values in a set,
+            (labels, function) with function called with the arrays of the labels
+            returning a bool array, e.g. (("rlnDefocusU", "rlnDefocusV"), lambda u, v: abs(u - v) < 500)
+        If tables are given, only these data tables are read. The other blocks are skipped
+        without parsing and reading stops once all the tables were read, so reading e.g.
+        data_optics at the beginning of a large particles file does not touch the particles.
+        With keepTokens, all the columns of loop tables are kept raw (converted on first
+        access) and their values are written exactly as read unless they were set, so
+        only the modified values and the added columns are re-formatted. The cache is
+        not used in this case.
+        With workers > 1, the data rows of large loop tables (WORKER_MIN_BYTES) of uncompressed
+        star files are split into byte ranges read and parsed by that many worker processes
+        (at most one per CPU) and concatenated here. Smaller tables are parsed here, faster
+        than starting the workers.
+        floatDtype (e.g. "float32") is the dtype of the columns of float labels, float64
+        by default. float32 halves the memory (and cache) of the columns but keeps only
+        about 7 significant digits, labelDtypes maps precision-sensitive labels to their
+        own dtype, e.g. floatDtype="float32", labelDtypes={"rlnCoordinateX": "float64"}.
+        """
+        for table in self._read(input_star, cache=cache, labels=labels, where=where, tables=tables,
+                                keepTokens=keepTokens, workers=workers, floatDtype=floatDtype,
+                                labelDtypes=labelDtypes):
+            pass
+
+    def scanBlocks(self, input_star):
+        """
+        Index of the data blocks of a star file: OrderedDict of the block names with
+        the byte offset of the block and the labels of the block (offsets in the uncompressed
+        data for compressed files). Data rows are skipped without parsing them.
+        """
+        blocks = OrderedDict()
+        with _openInput(input_star) as f:
+            reader = _StarFileReader(f)
+            while True:
+                offset = reader.tell()
+                rawLine = reader.readline()
+                if not rawLine:
+                    break
+                values = rawLine.split()
+                if values and b"data_" in values[0]:
+                    dataTableName = values[0].decode()
+                    blocks[dataTableName] = (offset, [])
+                elif values and values[0].startswith(b"_rln") and blocks:
+                    blocks[dataTableName][1].append(values[0][1:].decode())
+                elif values and blocks and blocks[dataTableName][1] and not values[0].startswith(b"#"):
+                    # first data row of the block
+                    reader.skipBlock()
+        return blocks
+
+    def _read(self, input_star, streamTable=None, chunkSize=None, cache=None, labels=None, where=None, tables=None,
+              keepTokens=False, workers=None, floatDtype=None, labelDtypes=None):
+        """ Read the star file, yielding the rows of streamTable in Table chunks instead of storing them. """
         self.clear()
+        self._setFloatDtypes(floatDtype, labelDtypes)
+        labels = set(labels) if labels is not None else None
+        tables = set(tables) if tables is not None else None
+        piped = PipeStage.current.input if input_star == "STDIN" and PipeStage.current is not None else None
+        if input_star != "STDIN" and TableStore.current is not None:
+            # a view of the tables kept by a long-lived process, no text to parse
+            piped = TableStore.current.get(input_star, keepTokens, floatDtype, labelDtypes)
+        # reading single tables is fast without the cache, the cache does not keep the tokens
+        cache = _cacheOption(cache) if input_star != "STDIN" and tables is None and not keepTokens and \
+            piped is None else False
+        if cache:
+            cachePath = self._cachePath(input_star, cache)
+            key = self._cacheKey(input_star)
+            if not self._loadCache(cachePath, key):
+                for table in self._read(input_star, cache=False, workers=workers, floatDtype=floatDtype,
+                                        labelDtypes=labelDtypes):
+                    pass
+                self._saveCache(cachePath, key)
+        if piped is not None and input_star == "STDIN" and not keepTokens:
+            # parsing the text of the previous stage would keep the text only of the raw columns
+            piped = piped.view()
+            for dataTableName in piped._tableNames():
+                table = getattr(piped, dataTableName)
+                converted = [name for name in table.raw | set(table.tokens) if labels is None or name in labels]
+                table._convertRaw(*table.raw.intersection(converted))
+                for name in converted:
+                    table.tokens.pop(name, None)
+        if piped is not None:
+            # the output of the previous stage of a pipeline (or a stored view), no text to parse
+            self._takeTables(piped, tables)
+        if cache or piped is not None:
+            if where:
+                for dataTableName in self._tableNames():
+                    table = getattr(self, dataTableName)
+                    if getattr(self, dataTableName + "_loop", False) and whereLabels(where) <= set(table.labels):
+                        columns = dict((label, table.column(label)) for label in whereLabels(where))
+                        del table[~whereMask(columns, len(table), where)]
+            for dataTableName in (streamTable, "data_"):
+                if streamTable is not None and hasattr(self, dataTableName) and \
+                        getattr(self, dataTableName + "_loop", False):
+                    table = getattr(self, dataTableName)
+                    table._flush()
+                    setattr(self, dataTableName, Table(table.labels))
+                    for chunk in self._chunkTables(dataTableName, (table.columns, table.missing, table._size, table.raw),
+                                                   chunkSize, table.tokens):
+                        yield chunk
+                    break
+            return
+
         found_label = False
         found_loop = False
         non_loop_values = []
+        # column chunks per data table, concatenated once the whole file is read
+        tableChunks = OrderedDict()
+        tablesRead = set()
 
-        if input_star == "STDIN":
-            f = sys.stdin
-        else:
-            f = open(input_star)
+        f = _openInput(input_star)
+        reader = _StarFileReader(f)
 
         def setItemValues(currentTableRead, values):
-            # Iterate in pairs (zipping) over labels and values in the row
-            item = Item()
-            # Dynamically set values, using label type (str by default)
-            for label, value in izip(getattr(self, currentTableRead + "_labels").values(), values):
-                self._setItemValue(item, label, value)
-            getattr(self, currentTableRead).append(item)
-
-        for line in f:
+            tableChunks.setdefault(currentTableRead, []).append(self._convertRows(currentTableRead, [values]))
+
+        while True:
+            rawLine = reader.readline()
+            if not rawLine:
+                break
+            line = rawLine.decode()
             values = line.strip().split()
 
             if not values and found_label and not found_loop:  # empty lines after non-loop labels
@@ -778,20 +2832,30 @@ class MetaData:
                 continue
 
             if "data_" in values[0]:
+                if tables is not None and tables <= tablesRead:
+                    # all the requested tables were read
+                    break
                 if values[0] == "data_":
                     self.version = "3"
                 else:
                     self.version = "3.1"
-                self.addDataTable(values[0])
-                currentTableRead = values[0]
                 found_label = False
                 found_loop = False
                 non_loop_values = []
+                if tables is not None and values[0] not in tables:
+                    reader.skipBlock()
+                    continue
+                tablesRead.add(values[0])
+                self.addDataTable(values[0])
+                currentTableRead = values[0]
+                tableChunks.pop(currentTableRead, None)
                 continue
 
             if values[0].startswith('loop_'):  # Label line
                 setattr(self, currentTableRead + "_loop", True)
                 found_loop = True
+                # the table gets (empty) columns also if the loop has no rows
+                tableChunks.setdefault(currentTableRead, [])
                 continue
 
             if values[0].startswith('_rln'):  # Label line
@@ -800,73 +2864,154 @@ class MetaData:
                 if not found_loop:
                     non_loop_values.append(values[1])
                 found_label = True
+            elif found_label and found_loop:
+                # Read all the data lines of the loop in bulk
+                streamed = streamTable is not None and currentTableRead in (streamTable, "data_")
+                if streamed:
+                    # store the tables read so far before handing out the rows
+                    for dataTableName, chunks in tableChunks.items():
+                        self._setTableChunks(dataTableName, chunks)
+                    tableChunks.clear()
+                ranges = self._workerRanges(input_star, f, reader.tell() - len(rawLine), workers) if workers else None
+                if ranges is not None:
+                    chunks = self._parseLoopRanges(currentTableRead, reader, ranges, workers, labels, where,
+                                                   keepTokens)
+                else:
+                    chunks = self._parseLoopChunks(currentTableRead, reader.loopChunks(rawLine), labels, where,
+                                                   keepTokens)
+                for chunk in chunks:
+                    if streamed:
+                        for table in self._chunkTables(currentTableRead, chunk, chunkSize):
+                            yield table
+                    else:
+                        tableChunks.setdefault(currentTableRead, []).append(chunk)
             elif found_label:  # Read data lines after at least one label
                 setItemValues(currentTableRead, values)
 
+        if found_label and not found_loop and non_loop_values:  # non-loop labels at the end of the file
+            setItemValues(currentTableRead, non_loop_values)
+
         f.close()
 
-    def _write(self, output_file):
+        for dataTableName, chunks in tableChunks.items():
+            self._setTableChunks(dataTableName, chunks)
 
-        # Add a comment with the command line used to generate the file; do it only if it was called from command line
-        if len(sys.argv) > 1:
-            self.comments.insert(0, "# " + ' '.join(sys.argv) + "\n")
+    def _takeTables(self, other, tables=None):
+        """ Take over the tables (not copied) of another MetaData, e.g. the output of a pipeline stage. """
+        self.version = other.version
+        self.comments = list(other.comments)
+        for dataTableName in other._tableNames():
+            if tables is None or dataTableName in tables:
+                for attribute in (dataTableName, dataTableName + "_labels", dataTableName + "_loop"):
+                    setattr(self, attribute, getattr(other, attribute))
 
-        # write comments in the beginning of the file
-        self.comments = list(dict.fromkeys(self.comments))  # removes duplicates while preserving order
-        for comment in self.comments:
-            output_file.write(comment + "\n")
+    def _tableNames(self):
+        return [attribute for attribute in dir(self)
+                if "data_" in attribute and "_labels" not in attribute and "_loop" not in attribute]
 
-        # Write labels and prepare the line format for rows
-        for attribute in dir(self):
-            if "data_" in attribute and "_labels" not in attribute and "_loop" not in attribute:
-                line_format = ""
-                if self.version == "3.1":
-                    if "_loop" not in attribute:
-                        output_file.write("\n\n%s\n\n" % attribute)
-                    if getattr(self, attribute + "_loop"):
-                        output_file.write("loop_\n")
+    def _cachePath(self, input_star, cache):
+        """ Directory of the binary cache of a star file. """
+        if cache is True:
+            head, tail = os.path.split(os.path.abspath(input_star))
+            return os.path.join(head, "." + tail + CACHE_SUFFIX)
+        name = _module("hashlib").sha1(os.path.abspath(input_star).encode()).hexdigest()[:16]
+        return os.path.join(cache, name + "_" + os.path.basename(input_star) + CACHE_SUFFIX)
+
+    def _cacheKey(self, input_star):
+        """ Key of the cache of a star file: its size, modification time and a hash of its header. """
+        stat = os.stat(input_star)
+        with open(input_star, "rb") as f:
+            header = _module("hashlib").sha1(f.read(CACHE_HEADER_BYTES)).hexdigest()
+        # caches of float32 and float64 columns are not interchangeable
+        dtypes = str(self.floatDtype), sorted((name, str(dtype)) for name, dtype in self.labelDtypes.items())
+        return CACHE_VERSION, stat.st_size, stat.st_mtime_ns, header, dtypes
+
+    def _loadCache(self, cachePath, key):
+        """
+        Load the tables from the cache, numerical columns are memory-mapped copy-on-write.
+        Returns False if there is no cache or it does not match the key.
+        """
+        try:
+            with open(os.path.join(cachePath, "metadata.pickle"), "rb") as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if state["key"] != key:
+            return False
+
+        self.version = state["version"]
+        self.comments = state["comments"]
+        for dataTableName, loop, labels, size, columns, missing in state["tables"]:
+            self.addDataTable(dataTableName, loop)
+            for labelName, labelType, inferred in labels:
+                self._addLabel(dataTableName, labelName)
+                label = getattr(self, dataTableName + "_labels")[labelName]
+                label.type, label.inferred = labelType, inferred
+            table = getattr(self, dataTableName)
+            for name, storage, width in columns:
+                fileName = os.path.join(cachePath, "%s.%s.npy" % (dataTableName, name))
+                if storage == "stack":
+                    table.columns[name] = StackColumn(np.load(fileName, mmap_mode="c"), Categorical(
+                        np.load(fileName[:-len(".npy")] + ".codes.npy", mmap_mode="c"),
+                        np.load(fileName[:-len(".npy")] + ".values.npy", allow_pickle=True)), width)
+                elif storage == "categorical":
+                    table.columns[name] = Categorical(np.load(fileName, mmap_mode="c"),
+                                                      np.load(fileName[:-len(".npy")] + ".values.npy",
+                                                              allow_pickle=True))
+                elif storage == "object":
+                    table.columns[name] = np.load(fileName, allow_pickle=True)
                 else:
-                    output_file.write("\n%s\n\nloop_\n" % attribute)
-
-                for i, l in enumerate(getattr(self, attribute + "_labels").values()):
-                    # Retrieve the type of the label
-                    t = l.type
-                    if getattr(self, attribute + "_loop"):
-                        output_file.write("_%s #%d \n" % (l.name, i + 1))
-                        if t is float:
-                            line_format += "%%(%s)f \t" % l.name
-                        elif t is int:
-                            line_format += "%%(%s)d \t" % l.name
-                        elif t is bool:
-                            line_format += "%%(%s)d \t" % l.name
-                        elif t is list:
-                            line_format += "%%(%s)s \t" % l.name
-                        else:
-                            line_format += "%%(%s)s \t" % l.name
+                    table.columns[name] = np.load(fileName, mmap_mode="c")
+            for name in missing:
+                table.missing[name] = np.load(os.path.join(cachePath, "%s.%s.missing.npy" % (dataTableName, name)))
+            table._size = size
+        return True
+
+    def _saveCache(self, cachePath, key):
+        """ Save the tables into the cache, failures (e.g. read-only directory) are ignored. """
+        tmpPath = "%s.%d.tmp" % (cachePath, os.getpid())
+        try:
+            os.makedirs(tmpPath)
+            tables = []
+            for dataTableName in self._tableNames():
+                table = getattr(self, dataTableName)
+                table._flush()
+                labels = [(l.name, l.type, l.inferred) for l in getattr(self, dataTableName + "_labels").values()]
+                columns = []
+                for name, column in table.columns.items():
+                    fileName = os.path.join(tmpPath, "%s.%s.npy" % (dataTableName, name))
+                    if isinstance(column, StackColumn):
+                        # slice numbers and codes are memory-mapped when loading
+                        np.save(fileName, column.slices)
+                        np.save(fileName[:-len(".npy")] + ".codes.npy", column.stacks.codes)
+                        np.save(fileName[:-len(".npy")] + ".values.npy", column.stacks.values)
+                        columns.append((name, "stack", column.width))
+                    elif isinstance(column, Categorical):
+                        # the codes are memory-mapped when loading
+                        np.save(fileName, column.codes)
+                        np.save(fileName[:-len(".npy")] + ".values.npy", column.values)
+                        columns.append((name, "categorical", None))
                     else:
-                        if t is float:
-                            line_format = "_%-35s%15f\n"
-                        elif t is int:
-                            line_format = "_%-35s%15d\n"
-                        elif t is bool:
-                            line_format = "_%-35s%15d\n"
-                        else:
-                            line_format = "_%-35s%15s\n"
-                        output_file.write(line_format % (l.name, getattr(getattr(self, attribute)[0], l.name)))
-
-                if getattr(self, attribute + "_loop"):
-                    line_format += '\n'
-
-                    for item in getattr(self, attribute):
-                        output_file.write(line_format % item)
+                        np.save(fileName, column)
+                        columns.append((name, "object" if column.dtype == object else "array", None))
+                for name, mask in table.missing.items():
+                    np.save(os.path.join(tmpPath, "%s.%s.missing.npy" % (dataTableName, name)), mask)
+                tables.append((dataTableName, getattr(self, dataTableName + "_loop", False), labels, len(table),
+                               columns, list(table.missing)))
+            state = {"key": key, "version": self.version, "comments": self.comments, "tables": tables}
+            with open(os.path.join(tmpPath, "metadata.pickle"), "wb") as f:
+                pickle.dump(state, f)
+            if os.path.isdir(cachePath):
+                _module("shutil").rmtree(cachePath)
+            os.rename(tmpPath, cachePath)
+        except OSError:
+            _module("shutil").rmtree(tmpPath, ignore_errors=True)
+
+    def _write(self, output_file):
+        StarWriter(output_file, self).close()
 
     def write(self, output_star):
-        if output_star == "STDOUT":
-            self._write(sys.stdout)
-        else:
-            output_file = open(output_star, 'w')
-            self._write(output_file)
-            output_file.close()
+        StarWriter(output_star, self).close()
 
     def printStar(self):
         self._write(sys.stdout)
@@ -902,9 +3047,10 @@ class MetaData:
             if key not in getattr(self, dataTableName + "_labels").keys():
                 self._addLabel(dataTableName, key)
 
-        for item in getattr(self, dataTableName):
-            for key, value in kwargs.items():
-                self._setItemValue(item, getattr(self, dataTableName + "_labels")[key], value)
+        table = getattr(self, dataTableName)
+        for key, value in kwargs.items():
+            # same value for all the rows, convert it once and fill the whole column
+            table.fillColumn(key, _convertValue(getattr(self, dataTableName + "_labels")[key], value))
 
     def _iterLabels(self, labels):
         """ Just a small trick to accept normal lists or *args
@@ -935,9 +3081,10 @@ class MetaData:
 
     def setData(self, dataTableName, data):
         """ Set internal data with new items. """
-        setattr(self, dataTableName, data)
+        table = Table(getattr(self, dataTableName + "_labels"))
+        table.extend(data)
+        setattr(self, dataTableName, table)
 
     def addData(self, dataTableName, data):
         """ Add new items to internal data. """
-        for item in data:
-            self.addItem(dataTableName, item)
+        getattr(self, dataTableName).extend(data)
@@ -43,15 +43,10 @@ class CreateMicrographStarFile:
             particles.append(particle)
         return particles
 
-    def filterUniqueMicrographs(self, particles):
-        uniqueMicsMetadata = []
-        uniqueMicsName = []
-
-        for particle in particles:
-            if particle.rlnMicrographName not in uniqueMicsName:
-                uniqueMicsMetadata.append(particle)
-                uniqueMicsName.append(particle.rlnMicrographName)
-        return uniqueMicsMetadata
+    def filterUniqueMicrographs(self, md, dataTableName):
+        # first particle of each micrograph
+        particles = getattr(md, dataTableName)
+        return [particles[i] for i in md.groupBy(dataTableName, "rlnMicrographName").first().tolist()]
 
     def main(self):
         self.define_parser()
@@ -60,9 +55,10 @@ class CreateMicrographStarFile:
 
         self.mprint("Selecting unique micrographs from particles star file...")
 
-        md = MetaData(args.i)
+        # only the labels of the micrographs are converted, the other particle columns are kept raw
+        ilabels = ["rlnMicrographName", "rlnDefocusU", "rlnDefocusV", "rlnDefocusAngle", "rlnPhaseShift", "rlnCtfBfactor", "rlnOpticsGroup"]
 
-        particles = self.get_particles(md, "data_particles")
+        md = MetaData(args.i, labels=ilabels)
 
         opticGroups = self.get_particles(md, "data_optics")
 
@@ -75,13 +71,10 @@ class CreateMicrographStarFile:
         md.removeLabels("data_optics", "rlnImagePixelSize")
         md.addLabels("data_optics", "rlnMicrographPixelSize")
 
-        uniqueMicrographs = self.filterUniqueMicrographs(particles)
+        uniqueMicrographs = self.filterUniqueMicrographs(md, "data_particles")
 
 
-        mdOut = md.clone()
-        mdOut.removeDataTable("data_particles")
-
-        ilabels = ["rlnMicrographName", "rlnDefocusU", "rlnDefocusV", "rlnDefocusAngle", "rlnPhaseShift", "rlnCtfBfactor", "rlnOpticsGroup"]
+        mdOut = md.cloneWithout("data_particles")
 
         mdOut.addDataTable("data_micrographs", True)
         mdOut.addLabels("data_micrographs", ilabels)
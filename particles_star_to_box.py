@@ -2,6 +2,7 @@
 
 import os
 import sys
+import numpy as np
 from metadata import MetaData
 import argparse
 
@@ -32,26 +33,14 @@ class ParticlesToBox:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
-    def getBoxes(self, particles):
-        boxesToSort = []
-
-        def sortFirst(val):
-            return val[0]
-
-        for particle in particles:
-            micName = particle.rlnMicrographName.split("/")[-1]
-            boxFileName = ("%s%s" %(micName[:-3], "box"))
-            boxesToSort.append([boxFileName, particle.rlnCoordinateX, particle.rlnCoordinateY])
-
-        boxesToSort.sort(key=sortFirst, reverse=False)
-
-        return boxesToSort
+    def getBoxes(self, md, tableName):
+        # row positions of the particles of each box file, sorted by the box file name
+        boxes = {}
+        for micName, rows in md.groupBy(tableName, "rlnMicrographName"):
+            micName = micName.split("/")[-1]
+            boxFileName = ("%s%s" % (micName[:-3], "box"))
+            boxes.setdefault(boxFileName, []).append(rows)
+        return [(boxFileName, np.sort(np.concatenate(boxes[boxFileName]))) for boxFileName in sorted(boxes)]
 
     def main(self):
         self.define_parser()
@@ -63,27 +52,17 @@ class ParticlesToBox:
 
         md = MetaData(args.i)
 
-        particles = self.get_particles(md)
-
-        boxes = self.getBoxes(particles)
+        tableName = "data_particles" if hasattr(md, "data_particles") else "data_"
+        coordsX = np.asarray(getattr(md, tableName).column("rlnCoordinateX"))
+        coordsY = np.asarray(getattr(md, tableName).column("rlnCoordinateY"))
 
         if not os.path.exists(args.o):
             os.makedirs(args.o)
 
-        micrographName = ""
-        boxFile = open("%s/%s" % (args.o, "dummy"), 'w')
-
-        for box in boxes:
-            if not box[0] == micrographName:
-                boxFile.close()
-                boxFile = open("%s/%s" %(args.o, box[0]), 'w')
-                micrographName = box[0]
-                boxFile.write("%d %d %s %s\n" % (box[1] - int(args.box_size/2), box[2] - int(args.box_size/2), args.box_size, args.box_size))
-            else:
-                boxFile.write("%d %d %s %s\n" % (box[1] - int(args.box_size / 2), box[2] - int(args.box_size / 2), args.box_size, args.box_size))
-        boxFile.close()
-
-        os.remove("%s/%s" % (args.o, "dummy"))
+        for boxFileName, rows in self.getBoxes(md, tableName):
+            with open("%s/%s" % (args.o, boxFileName), 'w') as boxFile:
+                for x, y in zip(coordsX[rows].tolist(), coordsY[rows].tolist()):
+                    boxFile.write("%d %d %s %s\n" % (x - int(args.box_size / 2), y - int(args.box_size / 2), args.box_size, args.box_size))
 
         print("Box-files written out. Have fun!")
 
@@ -31,12 +31,6 @@ class ParticlesToCoordsStar:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
     def writeCoordsFile(self, partCoords, outDir):
         mdOut = MetaData()
         particleTableName = "data_"
@@ -62,21 +56,11 @@ class ParticlesToCoordsStar:
 
         md = MetaData(args.i)
 
-        particles = self.get_particles(md)
-
-        partCoords = []
-
-        while len(particles) > 0:
-            partCoords.append(particles.pop(0))
-            if len(particles) != 0:
-                particlePos = 0
-                while particlePos < len(particles):
-                    if partCoords[0].rlnMicrographName == particles[particlePos].rlnMicrographName:
-                        partCoords.append(particles.pop(particlePos))
-                        particlePos -= 1
-                    particlePos += 1
-            self.writeCoordsFile(partCoords, args.o)
-            partCoords = []
+        tableName = "data_particles" if hasattr(md, "data_particles") else "data_"
+        particles = getattr(md, tableName)
+
+        for micName, rows in md.groupBy(tableName, "rlnMicrographName"):
+            self.writeCoordsFile([particles[i] for i in rows.tolist()], args.o)
 
         print("Star-files written out. Have fun!")
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import sys
+import shlex
+import argparse
+from argparse import RawTextHelpFormatter
+import time
+from lib.pipeline import splitStages, runPipeline
+
+
+class PipeStar:
+    def define_parser(self):
+        self.parser = argparse.ArgumentParser(
+            description="Run star scripts as a pipeline in one process. The star file written to STDOUT by a script is handed to the next one in memory, text is only read by the first script and written by the last one.\n The scripts and their arguments are the same as in a shell pipeline, with quoted \"|\" between them (or the whole pipeline as one quoted argument).\n\n Example:\n pipe_star.py select_values_star.py --i input.star --lb rlnAngleTilt --op \"<\" --val 90 \"|\" rotate_particles_star.py --rot 90 \"|\" select_orientations_star.py --o output.star\n pipe_star.py \"select_values_star.py --i input.star --lb rlnAngleTilt --op '<' --val 90 | rotate_particles_star.py --rot 90 --o output.star\"",
+            formatter_class=RawTextHelpFormatter)
+        add = self.parser.add_argument
+        add('stages', nargs=argparse.REMAINDER,
+            help="Scripts with their arguments separated by \"|\".")
+
+    def usage(self):
+        self.parser.print_help()
+
+    def error(self, *msgs):
+        self.usage()
+        print("Error: " + '\n'.join(msgs))
+        print(" ")
+        sys.exit(2)
+
+    def validate(self, args):
+        if not args.stages:
+            self.error("No scripts given.")
+
+        stages = shlex.split(args.stages[0]) if len(args.stages) == 1 else args.stages
+
+        try:
+            return splitStages(stages)
+        except ValueError as e:
+            self.error(str(e))
+
+    def main(self):
+        self.define_parser()
+        args = self.parser.parse_args()
+
+        stages = self.validate(args)
+        start_total = time.time()
+
+        try:
+            runPipeline(stages)
+        except (ValueError, RuntimeError) as e:
+            print("Error: %s" % e, file=sys.stderr)
+            sys.exit(1)
+
+        print("Pipeline of %d scripts finished in %.2f seconds." % (len(stages), time.time() - start_total),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    PipeStar().main()
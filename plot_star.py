@@ -6,7 +6,6 @@ from metadata import MetaData
 from metadata import LABELS
 import argparse
 from argparse import RawTextHelpFormatter
-from matplotlib import pyplot as plt
 import numpy
 
 
@@ -75,25 +74,17 @@ class PlotStar:
         if args.scatter and args.hist_bins > 0:
             self.error("You cannot use --scatter and --hist_bins at the same time.")
 
-    def get_particles(self, md, dataTable):
-        particles = []
-        if md.version != "3.1":
-            dataTable="data_"
-        for particle in getattr(md, dataTable):
-            particles.append(particle)
-        return particles
-
-    def getLabelValues(self, particles, label):
-        labelValues = []
-        for particle in particles:
-            labelValues.append(getattr(particle, label))
-        return labelValues
+    def getLabelValues(self, md, dataTable, label):
+        # column of the label as a numpy array, not copied from the table
+        return md.toNumpy(dataTable, [label])[label]
 
     def main(self):
         self.define_parser()
         args = self.parser.parse_args()
         self.validate(args)
 
+        from matplotlib import pyplot as plt
+
         if " " in args.i:
             inputFiles = str(args.i).replace('\n', ' ').split(" ")
         elif "," in args.i:
@@ -150,19 +141,19 @@ class PlotStar:
         yTitle = plotTitle = ""
 
         for inputFile in inputFiles:
-            md = MetaData(inputFile)
+            # parse only the plotted columns
+            md = MetaData(inputFile, labels=[args.lbx] + str(args.lby).split(","))
 
-            dataTable = str(args.data)
-            particles = self.get_particles(md, dataTable)
+            dataTable = str(args.data) if md.version == "3.1" else "data_"
 
             plotTitle = inputFile
             xTitle = args.lbx
 
             if args.lbx == "" or args.hist_bins > 0:
-                xValues = range(len(particles))
+                xValues = range(len(getattr(md, dataTable)))
                 xTitle = "record #"
             else:
-                xValues = self.getLabelValues(particles, args.lbx)
+                xValues = self.getLabelValues(md, dataTable, args.lbx)
 
             yLabels = str(args.lby).split(",")
 
@@ -172,7 +163,7 @@ class PlotStar:
                 alphaVal = 1
 
             for yLabel in yLabels:
-                yValues = self.getLabelValues(particles, yLabel)
+                yValues = self.getLabelValues(md, dataTable, yLabel)
 
                 yTitle = yLabel
                 if type(axis) == numpy.ndarray:  # multiplot
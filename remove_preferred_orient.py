@@ -6,6 +6,7 @@ from metadata import MetaData
 import argparse
 import math
 from argparse import RawTextHelpFormatter
+from lib import ops
 
 
 class RemovePrefOrientStar:
@@ -39,76 +40,20 @@ class RemovePrefOrientStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md):
-
-        particles = []
-
-        for particle in md:
-            particles.append(particle)
-        return particles
-
-    def reduceParticlesCount(self, particles, maxCount):
-
-        sortedParticles = []
-        particlesToSort = []
-
-        def sortSecond(val):
-            return val[1]
-
-        for partPos, particle in enumerate(particles, start=0):
-            particlesToSort.append([partPos, particle.rlnMaxValueProbDistribution])
-
-        particlesToSort.sort(key=sortSecond, reverse=True)
-
-        for i in range(maxCount):
-            selectedParticle = particlesToSort.pop(0)
-            sortedParticles.append(particles[selectedParticle[0]])
-
-        return sortedParticles
-
     def removePrefOrient(self, particles, xSD):
-
-        # generate array of 1 deg orientation step from rot and tilt angle
-        heatmap = [[0 for col in range(360)] for row in range(180)]
-        heatmappart = [[[] for col in range(360)] for row in range(180)]
-
-        for partpos, particle in enumerate(particles, start=0):
-            if particle.rlnAngleRot <= 0:
-                angleRot = particle.rlnAngleRot + 360
-            else:
-                angleRot = particle.rlnAngleRot
-            heatmap[int(particle.rlnAngleTilt)][int(angleRot)] += 1
-            heatmappart[int(particle.rlnAngleTilt)][int(angleRot)].append(partpos)
+        # particle counts of the 1 deg orientation steps of rot and tilt angle
+        counts = ops.orientationCounts(particles).tolist()
 
         # calculate statistics (avg and SD)
-        particleSum = 0
-        n = 0
-        maxCount = 0
-        minCount = 1
-
-        for i in range(180):
-            for j in range(360):
-                if heatmap[i][j] != 0:
-                    particleSum += heatmap[i][j]
-                    if maxCount < heatmap[i][j]: maxCount = heatmap[i][j]
-                    if minCount > heatmap[i][j]: minCount = heatmap[i][j]
-                    n += 1
-
-        averageParticleCount = particleSum / n
+        averageParticleCount = sum(counts) / len(counts)
 
-        self.mprint("Max count of particles per orientation %s" % maxCount)
+        self.mprint("Max count of particles per orientation %s" % max(counts))
 
-        self.mprint("Min count of particles per orientation %s" % minCount)
+        self.mprint("Min count of particles per orientation %s" % min(counts))
 
         self.mprint("Average count of particles per orientation %s" % averageParticleCount)
 
-        sigmaSum = 0.0
-
-        for i in range(180):
-            for j in range(360):
-                if heatmap[i][j] != 0:
-                    sigmaSum += (heatmap[i][j] - averageParticleCount) ** 2
-        particleSdev = math.sqrt(sigmaSum / (n - 1))
+        particleSdev = math.sqrt(sum((count - averageParticleCount) ** 2 for count in counts) / (len(counts) - 1))
 
         self.mprint("SD of the average count %.03f" % particleSdev)
 
@@ -117,36 +62,9 @@ class RemovePrefOrientStar:
         self.mprint(
             "Including max %s particles per orientation in the final star file." % int(orientationCountTreshold))
 
-        newParticleSet = []
-
         self.mprint("Removing overepresented orientations....")
 
-        for i in range(180):
-            for j in range(360):
-                if heatmap[i][j] != 0:
-                    if heatmap[i][j] <= int(orientationCountTreshold):
-                        # add particles automatically
-                        for particlepos in heatmappart[i][j]:
-                            newParticleSet.append(particles[particlepos])
-                    if heatmap[i][j] > int(orientationCountTreshold):
-                        # add particles after reducing their count
-                        particlesForReduction = []
-                        for particlepos in heatmappart[i][j]:
-                            particlesForReduction.append(particles[particlepos])
-                        newParticleSet.extend(
-                            self.reduceParticlesCount(particlesForReduction, int(orientationCountTreshold)))
-
-            # a simple progress bar
-            if self.args.o != "STDOUT":
-                sys.stdout.write('\r')
-                progress = int(i / 9) + 1
-                sys.stdout.write("[%-20s] %d%%" % ('=' * progress, 5 * progress))
-                sys.stdout.flush()
-                # sleep(0.25)
-        if self.args.o != "STDOUT":
-            sys.stdout.write('\r\n')
-
-        return newParticleSet
+        return ops.removePreferredOrientation(particles, int(orientationCountTreshold))
 
     def main(self):
         self.define_parser()
@@ -158,20 +76,15 @@ class RemovePrefOrientStar:
 
         md = MetaData(args.i)
 
-        particles = self.get_particles(md)
-
-        new_particles = []
-
-        new_particles.extend(self.removePrefOrient(particles, args.sd))
-
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
+        new_particles = self.removePrefOrient(getattr(md, dataTableName), args.sd)
+
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
         mdOut.addData(dataTableName, new_particles)
@@ -6,7 +6,6 @@ from metadata import MetaData
 import argparse
 import math
 from argparse import RawTextHelpFormatter
-import healpy as hp
 
 
 class RemovePrefOrientStar:
@@ -71,6 +70,7 @@ class RemovePrefOrientStar:
         return sortedParticles
 
     def removePrefOrient(self, particles, xSD, hlpxOrder):
+        import healpy as hp
 
         NSIDE = hlpxOrder ** 2
 
@@ -161,9 +161,8 @@ class RemovePrefOrientStar:
         new_particles.extend(self.removePrefOrient(particles, args.sd, args.hlpx_order))
 
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
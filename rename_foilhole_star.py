@@ -75,8 +75,7 @@ class RenameStar:
         self.renameMicrographs(micrographs, args.mic_dir)
 
         if md.version == "3.1":
-            mdOut = md.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
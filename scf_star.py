@@ -47,7 +47,7 @@ class SCFstarCalc:
         args = self.parser.parse_args()
         self.validate(args)
 
-        md = MetaData(args.i)
+        md = MetaData(args.i, labels=["rlnAngleRot", "rlnAngleTilt", "rlnAnglePsi"])
 
         dataTable = "data_particles"
 
@@ -4,6 +4,7 @@ import os
 import sys
 from metadata import MetaData
 import argparse
+from lib import ops
 import time
 
 
@@ -38,12 +39,6 @@ class selMaxProbSymStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
     def maxProbParticle(self, symCopies):
         maxLikeParticle = symCopies[0]
         for particle in symCopies:
@@ -51,21 +46,9 @@ class selMaxProbSymStar:
                 maxLikeParticle = particle
         return maxLikeParticle
 
-    def selMostProbableParticles(self, particles, symCopyLabel):
-        # Group particles by their symCopyLabel
-        particleGroups = {}
-
-        for particle in particles:
-            key = getattr(particle, symCopyLabel)
-            if key not in particleGroups:
-                particleGroups[key] = []
-            particleGroups[key].append(particle)
-
-        # Find max probability particle for each group
-        newParticles = []
-        for group in particleGroups.values():
-            maxParticle = max(group, key=lambda p: p.rlnMaxValueProbDistribution)
-            newParticles.append(maxParticle)
+    def selMostProbableParticles(self, md, dataTableName, symCopyLabel):
+        # Group particles by their symCopyLabel and take the max probability particle of each group
+        newParticles = ops.selectMaxProbSymCopies(getattr(md, dataTableName), symCopyLabel)
 
         self.mprint(f"Selected {len(newParticles)} particles from the original star file.")
         return newParticles
@@ -83,21 +66,18 @@ class selMaxProbSymStar:
 
         self.mprint("Reading in input star file.....")
 
-        particles = self.get_particles(md)
+        dataTableName = "data_particles" if md.version == "3.1" else "data_"
 
         self.mprint(
             "Total %s particles in input star file. \nSelecting one orientation per particle according to the greatest value of rlnMaxValueProbDistribution." % str(
-                len(particles)))
+                len(getattr(md, dataTableName))))
 
-        new_particles.extend(self.selMostProbableParticles(particles, args.lb))
+        new_particles.extend(self.selMostProbableParticles(md, dataTableName, args.lb))
 
         if md.version == "3.1":
-            mdOut = md.clone()
-            dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
-            dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
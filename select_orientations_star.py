@@ -2,7 +2,8 @@
 
 import os
 import sys
-from metadata import MetaData
+from metadata import MetaData, StarWriter, WRITE_CHUNK_ROWS
+from lib import ops
 import argparse
 
 
@@ -41,23 +42,6 @@ class SelOrientStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
-    def selParticles(self, particles, rotMin, rotMax, tiltMin, tiltMax, psiMin, psiMax):
-        newParticles = []
-        while len(particles) > 0:
-            selectedParticle = particles.pop(0)
-            if (selectedParticle.rlnAngleRot >= rotMin and selectedParticle.rlnAngleRot <= rotMax) and (
-                    selectedParticle.rlnAngleTilt >= tiltMin and selectedParticle.rlnAngleTilt <= tiltMax) and (
-                    selectedParticle.rlnAnglePsi >= psiMin and selectedParticle.rlnAnglePsi <= psiMax):
-                newParticles.append(selectedParticle)
-        self.mprint(str(len(newParticles)) + " particles included in selection.")
-        return newParticles
-
     def main(self):
         self.define_parser()
         args = self.parser.parse_args()
@@ -66,29 +50,27 @@ class SelOrientStar:
 
         self.mprint("Selecting particles from star file...")
 
-        md = MetaData(args.i)
-
-        new_particles = []
-
-        particles = self.get_particles(md)
-
-        new_particles.extend(
-            self.selParticles(particles, args.rot_min, args.rot_max, args.tilt_min, args.tilt_max, args.psi_min,
-                              args.psi_max))
+        # particles out of the ranges are skipped while reading
+        md = MetaData()
+        where = ops.orientationConditions((args.rot_min, args.rot_max), (args.tilt_min, args.tilt_max),
+                                          (args.psi_min, args.psi_max))
+        tables = md.iterRows(args.i, chunkSize=WRITE_CHUNK_ROWS, where=where)
 
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-        mdOut.addData(dataTableName, new_particles)
-
-        mdOut.write(args.o)
+        selectedCounter = 0
+        with StarWriter(args.o, mdOut, dataTableName, source=md) as writer:
+            for particles in tables:
+                selectedCounter += len(particles)
+                writer.writeRows(particles)
+        self.mprint(str(selectedCounter) + " particles included in selection.")
 
         self.mprint("New star file %s created. Have fun!" % args.o)
 
@@ -2,9 +2,9 @@
 
 import os
 import sys
-import random
 from metadata import MetaData
 import argparse
+from lib import ops
 
 
 class RandSymStar:
@@ -36,30 +36,16 @@ class RandSymStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
-    def randParticles(self, particles):
-        # Group particles by image name in a dictionary
-        particle_groups = {}
-        for particle in particles:
-            img_name = particle.rlnImageName
-            if img_name not in particle_groups:
-                particle_groups[img_name] = []
-            particle_groups[img_name].append(particle)
+    def randParticles(self, md, dataTableName):
+        # Group particles by image name
+        particles = getattr(md, dataTableName)
+        groups = md.groupBy(dataTableName, "rlnImageName")
 
         # Get symmetry fold from first group
-        first_group = next(iter(particle_groups.values()))
-        sym_fold = len(first_group)
+        sym_fold = int(groups.count()[0])
         print(f"Detected {sym_fold}-fold symmetry.")
 
-        newParticles = [
-            random.choice(group)
-            for group in particle_groups.values()
-        ]
+        newParticles = ops.selectRandomSymCopies(particles, "rlnImageName", groups=groups)
 
         self.mprint(f"Selected {len(newParticles)} random particles from their symmetry copies.")
         return newParticles
@@ -76,21 +62,18 @@ class RandSymStar:
 
         self.mprint("Reading in input star file.....")
 
-        particles = self.get_particles(md)
+        dataTableName = "data_particles" if md.version == "3.1" else "data_"
 
         self.mprint(
             "Total %s particles in input star file. \nSelecting random particles from their symmetry copies." % str(
-                len(particles)))
+                len(getattr(md, dataTableName))))
 
-        new_particles.extend(self.randParticles(particles))
+        new_particles.extend(self.randParticles(md, dataTableName))
 
         if md.version == "3.1":
-            mdOut = md.clone()
-            dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
-            dataTableName = "data_"
 
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
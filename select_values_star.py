@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
-import math
 import os
 import sys
-import operator
-from metadata import MetaData
+from metadata import MetaData, StarWriter, WRITE_CHUNK_ROWS
 from metadata import LABELS
+from lib import ops
 import argparse
 from argparse import RawTextHelpFormatter
 import time
@@ -121,73 +120,16 @@ class SelValueStar:
         if self.args.o != "STDOUT":
             print(message)
 
-    def get_particles(self, md, dataTableName):
-        particles = []
-        for particle in getattr(md, dataTableName):
-            particles.append(particle)
-        return particles
-
-    def percentile(self, N, percent, key=lambda x: x):
-        """
-        Find the percentile of a list of values.
-
-        @parameter N - is a list of values. Note N MUST BE already sorted.
-        @parameter percent - a float value from 0.0 to 1.0.
-        @parameter key - optional key function to compute value from each element of N.
-
-        @return - the percentile of the values
-        """
-        if not N:
-            return None
-        k = (len(N) - 1) * percent
-        f = math.floor(k)
-        c = math.ceil(k)
-        if f == c:
-            return key(N[int(k)])
-        d0 = key(N[int(f)]) * (c - k)
-        d1 = key(N[int(c)]) * (k - f)
-
-        return d0 + d1
-
-    def selParticles(self, particles, atr, op_char, value, rangeHi, rangeLo, rangeSel, prctl_l, prctl_h):
-        ops = {
-            "=": operator.eq,
-            "!=": operator.ne,
-            ">": operator.gt,
-            ">=": operator.ge,
-            "<": operator.lt,
-            "<=": operator.le
-        }
-
-        # Process percentiles first if needed
-        if prctl_h > -1 or prctl_l > -1:
-            allValues = sorted(getattr(p, atr) for p in particles)
-            prctl = max(prctl_l, prctl_h)
-            value = self.percentile(allValues, prctl / 100.0)
-
-            if prctl_l > -1:
-                op_func = ops["<="]
-                self.mprint(f"Selecting below {prctl}-th percentile of data. {atr} values less or equal {value}.")
-            else:
-                op_func = ops[">="]
-                self.mprint(f"Selecting above {prctl}-th percentile of data. {atr} values more or equal {value}.")
-        else:
-            op_func = ops[op_char]
-
-        if rangeSel:
-            newParticles = [
-                p for p in particles
-                if rangeLo <= getattr(p, atr) <= rangeHi
-            ]
-        else:
-            newParticles = [
-                p for p in particles
-                if op_func(getattr(p, atr), value)
-            ]
-
-        self.mprint(f"{len(newParticles)} particles included in selection.")
-        return newParticles
+    def selPercentile(self, particles, atr, prctl_l, prctl_h):
+        # percentiles need all the values before selecting
+        prctl = max(prctl_l, prctl_h)
+        value = ops.labelPercentile(particles, atr, prctl / 100.0)
 
+        if prctl_l > -1:
+            self.mprint(f"Selecting below {prctl}-th percentile of data. {atr} values less or equal {value}.")
+            return ops.selectValues(particles, atr, "<=", value)
+        self.mprint(f"Selecting above {prctl}-th percentile of data. {atr} values more or equal {value}.")
+        return ops.selectValues(particles, atr, ">=", value)
 
     def main(self):
         self.define_parser()
@@ -199,29 +141,39 @@ class SelValueStar:
         elif args.prctl_l == "-1" and args.prctl_h == "-1":
             self.mprint("Selecting particles where %s is %s %s." % (args.lb, args.op, compValue))
         start_total = time.time()
-        md = MetaData(args.i)
-
         dataTableName = args.data
 
-        new_particles = []
-
-        particles = self.get_particles(md, dataTableName)
+        # rows not fulfilling the selection are skipped while reading (percentiles need all the rows)
+        if rangeSel:
+            where = [(args.lb, "range", (rangeLo, rangeHi))]
+        elif prctl_l == -1 and prctl_h == -1:
+            where = [(args.lb, args.op, compValue)]
+        else:
+            where = None
 
-        new_particles.extend(
-            self.selParticles(particles, args.lb, args.op, compValue, rangeHi, rangeLo, rangeSel, prctl_l, prctl_h))
+        md = MetaData()
+        if where is None:
+            md.read(args.i, keepTokens=True)
+        else:
+            tables = md.iterRows(args.i, dataTableName, chunkSize=WRITE_CHUNK_ROWS, where=where, keepTokens=True)
 
         if md.version == "3.1":
-            mdOut = md.clone()
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
 
+        if where is None:
+            tables = [self.selPercentile(getattr(md, dataTableName), args.lb, prctl_l, prctl_h)]
+
         mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
         mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-        mdOut.addData(dataTableName, new_particles)
-
-        mdOut.write(args.o)
+        selectedCounter = 0
+        with StarWriter(args.o, mdOut, dataTableName, source=md) as writer:
+            for particles in tables:
+                selectedCounter += len(particles)
+                writer.writeRows(particles)
+        self.mprint(f"{selectedCounter} particles included in selection.")
         self.mprint(f"Total execution time: {time.time() - start_total:.2f} seconds")
         self.mprint("New star file %s created. Have fun!" % args.o)
 
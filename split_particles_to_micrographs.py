@@ -3,6 +3,7 @@
 import os
 import sys
 import struct
+import numpy as np
 from metadata import MetaData
 from metadata import LABELS
 import argparse
@@ -39,29 +40,14 @@ class splitStacksToMics:
             particles.append(particle)
         return particles
 
-    def splitMrcStack(self,stackFile, outFile):
-        # extract filename, image index
-        imageIndex, mrcsFilename = stackFile.split("@")
-        imageIndex = int(imageIndex)
-
-        # read in mrcs file, open mrc file for output
-        mrcsFile = open(mrcsFilename, "rb")
-        mrcFile = open(outFile, 'wb+')
-
+    def splitMrcStack(self, mrcsFile, mrcHeader, imageIndex, outFile):
         # get image size
-        imageSize = int(struct.unpack('i', mrcsFile.read(4))[0])
-
-        # write header
-        mrcsFile.seek(0, 0)
-        chunkSize = 1024
-        mrcHeader = mrcsFile.read(chunkSize)
-        mrcFile.write(mrcHeader)
+        imageSize = int(struct.unpack('i', mrcHeader[:4])[0])
 
-        # change Z dimension to 1
-        mrcFile.seek(8, 0)
-        mrcFile.write(b"\x01\x00")
+        mrcFile = open(outFile, 'wb+')
 
-        mrcFile.seek(1024, 0)
+        # write header, change Z dimension to 1
+        mrcFile.write(mrcHeader[:8] + b"\x01\x00" + mrcHeader[10:])
 
         # write mrc data file
         mrcsFile.seek(imageSize ** 2 * 4 * (imageIndex - 1) + 1024, 0)
@@ -69,22 +55,31 @@ class splitStacksToMics:
         mrcImage = mrcsFile.read(chunkSize)
         mrcFile.write(mrcImage)
 
-        mrcsFile.close()
         mrcFile.close()
 
-    def splitParticlesToMicrographs(self,particles, outPrefix):
-        newParticles = []
+    def splitParticlesToMicrographs(self, table, outPrefix):
+        particles = list(table)
         counter = 0
         one20th = int(len(particles)/20)
         print("Splitting %s particle stacks into separate micrographs..." % str(len(particles)))
 
-        for particle in particles:
-            imageIndex, mrcsPath = particle.rlnImageName.split("@")
+        # particles are processed grouped by stack and ordered by image index, each stack is opened once
+        imageIndexes, stacks = table.imageStack()
+        imageNames = table.column("rlnImageName").tolist()
+        mrcsFile = None
+        stackCode = None
+        for i in np.lexsort((imageIndexes, stacks.codes)).tolist():
+            if stacks.codes[i] != stackCode:
+                if mrcsFile is not None:
+                    mrcsFile.close()
+                stackCode = stacks.codes[i]
+                mrcsFile = open(stacks.values[stackCode], "rb")
+                mrcHeader = mrcsFile.read(1024)
+            imageIndex, mrcsPath = imageNames[i].split("@")
             mrcsFilename = mrcsPath.split("/")[-1]
             outMicName = outPrefix + "/" + mrcsFilename[:-5]+"_"+imageIndex+".mrc"
-            self.splitMrcStack(particle.rlnImageName, outMicName)
-            particle.rlnMicrographName = outMicName
-            newParticles.append(particle)
+            self.splitMrcStack(mrcsFile, mrcHeader, int(imageIndexes[i]), outMicName)
+            particles[i].rlnMicrographName = outMicName
             counter += 1
             # a simple progress bar
             sys.stdout.write('\r')
@@ -93,8 +88,11 @@ class splitStacksToMics:
             sys.stdout.flush()
             # sleep(0.25)
 
+        if mrcsFile is not None:
+            mrcsFile.close()
+
         sys.stdout.write('\r\n')
-        return newParticles
+        return particles
 
     def main(self):
         self.define_parser()
@@ -110,17 +108,15 @@ class splitStacksToMics:
 
         new_particles = []
 
-        particles = self.get_particles(md)
-
         if not os.path.exists(args.o):
             os.makedirs(args.o)
 
-        new_particles.extend(self.splitParticlesToMicrographs(particles, args.o))
+        table = md.data_particles if md.version == "3.1" else md.data_
+        new_particles.extend(self.splitParticlesToMicrographs(table, args.o))
 
         if md.version == "3.1":
-            mdOut = md.clone()
             dataTableName = "data_particles"
-            mdOut.removeDataTable(dataTableName)
+            mdOut = md.cloneWithout(dataTableName)
         else:
             mdOut = MetaData()
             dataTableName = "data_"
@@ -5,6 +5,7 @@ import sys
 from metadata import MetaData
 import argparse
 import struct
+import numpy as np
 
 
 class SplitStacks:
@@ -33,28 +34,14 @@ class SplitStacks:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def splitMrcStack(self, stackFile, outFile):
-        # extract filename, image index
-        imageIndex, mrcsFilename = stackFile.split("@")
-        imageIndex = int(imageIndex)
-
-        # read in mrcs file, open mrc file for output
-        mrcsFile = open(mrcsFilename, "rb")
-        mrcFile = open(outFile, 'wb+')
-
+    def splitMrcStack(self, mrcsFile, mrcHeader, imageIndex, outFile):
         # get image size
-        imageSize = int(struct.unpack('i', mrcsFile.read(4))[0])
+        imageSize = int(struct.unpack('i', mrcHeader[:4])[0])
 
-        # write header
-        mrcsFile.seek(0, 0)
-        chunkSize = 1024
-        mrcHeader = mrcsFile.read(chunkSize)
-        mrcFile.write(mrcHeader)
+        mrcFile = open(outFile, 'wb+')
 
-        # change Z dimension to 1
-        mrcFile.seek(8, 0)
-        mrcFile.write(b"\x01\x00")
-        mrcFile.seek(1024, 0)
+        # write header, change Z dimension to 1
+        mrcFile.write(mrcHeader[:8] + b"\x01\x00" + mrcHeader[10:])
 
         # write mrc data file
         mrcsFile.seek(imageSize ** 2 * 4 * (imageIndex - 1) + 1024, 0)
@@ -62,9 +49,24 @@ class SplitStacks:
         mrcImage = mrcsFile.read(chunkSize)
         mrcFile.write(mrcImage)
 
-        mrcsFile.close()
         mrcFile.close()
 
+    def splitMrcStacks(self, table, outFiles):
+        # particles are processed grouped by stack and ordered by image index, each stack is opened once
+        imageIndexes, stacks = table.imageStack()
+        mrcsFile = None
+        stackCode = None
+        for i in np.lexsort((imageIndexes, stacks.codes)).tolist():
+            if stacks.codes[i] != stackCode:
+                if mrcsFile is not None:
+                    mrcsFile.close()
+                stackCode = stacks.codes[i]
+                mrcsFile = open(stacks.values[stackCode], "rb")
+                mrcHeader = mrcsFile.read(1024)
+            self.splitMrcStack(mrcsFile, mrcHeader, int(imageIndexes[i]), outFiles[i])
+        if mrcsFile is not None:
+            mrcsFile.close()
+
     def main(self):
         self.define_parser()
         args = self.parser.parse_args()
@@ -78,15 +80,16 @@ class SplitStacks:
         if not os.path.exists(args.o_dir):
             os.makedirs(args.o_dir)
 
-        for i, particle in enumerate(md, start=1):
-            outputImageName = '%s/%s_%06d.mrc' % (args.o_dir, args.o_pref, i)
-            self.splitMrcStack(particle.rlnImageName, outputImageName)
-            particle.rlnImageName = outputImageName
-            particle.rlnMicrographName = outputImageName
+        table = md.data_particles if hasattr(md, "data_particles") else md.data_
+        outputImageNames = np.array(['%s/%s_%06d.mrc' % (args.o_dir, args.o_pref, i)
+                                     for i in range(1, len(table) + 1)], dtype=object)
+        self.splitMrcStacks(table, outputImageNames)
+        table.setColumn("rlnImageName", outputImageNames)
+        table.setColumn("rlnMicrographName", outputImageNames.copy())
 
         md.write(args.o_pref + ".star")
 
-        print("Total %s images created from MRC stacks." % str(i))
+        print("Total %s images created from MRC stacks." % str(len(table)))
 
         print("New star file %s.star created. Have fun!" % args.o_pref)
 
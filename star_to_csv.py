@@ -37,16 +37,8 @@ class StarToCsv:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def get_records(self, md, dataTable):
-        records = []
-        for record in getattr(md, dataTable):
-            records.append(record)
-        return records
-
     def generateCSVlines(self, records, iLabels, delimiter):
-        header = delimiter.join(iLabels)
-        lines = []
-        lines.append(header)
+        yield delimiter.join(iLabels)
         for record in records:
             line = []
             for iLabel in iLabels:
@@ -55,18 +47,18 @@ class StarToCsv:
                     line.append(str(val))
                 else:
                     line.append("NA")
-            lines.append(delimiter.join(line))
-        return lines
+            yield delimiter.join(line)
 
     def main(self):
         self.define_parser()
         args = self.parser.parse_args()
         self.validate(args)
 
-        md = MetaData(args.i)
-
         dataTable = args.data
 
+        md = MetaData()
+        records = md.iterRows(args.i, dataTable)
+
         if args.lb == "ALL":
             if md.version == "3.1":
                 iLabels = md.getLabels(dataTable)
@@ -75,8 +67,6 @@ class StarToCsv:
         else:
             iLabels = args.lb.replace(","," ").split(" ")
 
-        records = self.get_records(md, dataTable)
-
         csvLines = self.generateCSVlines(records, iLabels, args.delim)
 
         if args.o == "STDOUT":
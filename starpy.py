@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+from lib.commands import SCRIPTS_DIR, commands, commandPath
+
+# commands timed by the startup benchmark, they need only metadata.py and numpy
+BENCHMARK_COMMANDS = ["stats", "select", "join"]
+# allowed start time of a benchmarked command on top of the start of python importing numpy
+BENCHMARK_LIMIT_MS = 50
+BENCHMARK_RUNS = 7
+
+USAGE = """usage: starpy.py <command> [arguments]
+
+Runs one of the starpy scripts, e.g. "starpy.py stats --i input.star" runs stats_star.py.
+Only the modules needed by the command are imported.
+
+  starpy.py --list       List the commands.
+  starpy.py --benchmark  Time the start of the light commands (%s).
+  starpy.py --batch <files> [--o_tmpl <output>] [--jobs N] <command> [arguments]
+                         Run the command on each of the files (see starpy.py --batch --h).
+  starpy.py --serve [--socket <path>] [--mem_mb N]
+                         Start a server keeping the star files read by the commands parsed in memory,
+                         up to N MB (Default: 4096), listening on a Unix socket (Default: $STARPY_SOCKET
+                         or starpy.sock in $XDG_RUNTIME_DIR or /tmp/starpy-<uid>).
+  starpy.py --client [--socket <path>] <command> [arguments]
+                         Run the command in the server. --status lists the files it holds, --stop stops it.
+""" % ", ".join(BENCHMARK_COMMANDS)
+
+
+class StarPy:
+    def usage(self):
+        print(USAGE)
+
+    def error(self, *msgs):
+        self.usage()
+        print("Error: " + '\n'.join(msgs))
+        print(" ")
+        sys.exit(2)
+
+    def scriptPath(self, command):
+        path = commandPath(command)
+        if path is None:
+            self.error("Unknown command '%s'. Use --list to show the commands." % command)
+        return path
+
+    def run(self, command, args):
+        path = self.scriptPath(command)
+
+        # run the script as __main__, like runpy.run_path but without importing runpy and pkgutil
+        from importlib.machinery import SourceFileLoader
+        import types
+        loader = SourceFileLoader("__main__", path)
+        module = types.ModuleType("__main__")
+        module.__file__, module.__loader__ = path, loader
+        sys.modules["__main__"] = module
+        sys.argv = [path] + args
+        loader.exec_module(module)
+
+    def startTime(self, args):
+        """ Median wall time (ms) of starting python with args. """
+        import subprocess
+        import time
+
+        times = []
+        for i in range(BENCHMARK_RUNS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        return sorted(times)[len(times) // 2]
+
+    def benchmark(self):
+        """ Print the start times of the light commands, exits with 1 if one is over the limit. """
+        baseline = self.startTime(["-c", "import numpy"])
+        print("%-12s %7.1f ms" % ("python+numpy", baseline))
+        slow = []
+        for command in BENCHMARK_COMMANDS:
+            ms = self.startTime([os.path.join(SCRIPTS_DIR, "starpy.py"), command, "--h"])
+            print("%-12s %7.1f ms  (%+.1f ms)" % (command, ms, ms - baseline))
+            if ms - baseline > BENCHMARK_LIMIT_MS:
+                slow.append(command)
+        if slow:
+            print("Start of %s takes more than %d ms on top of python+numpy." % (", ".join(slow), BENCHMARK_LIMIT_MS))
+            sys.exit(1)
+
+    def batch(self, argv):
+        """ Run a command on each of many files, exits with 1 if it failed for some of them. """
+        import argparse
+        from argparse import RawTextHelpFormatter
+        from lib.batch import batchFiles, runBatch
+
+        parser = argparse.ArgumentParser(
+            usage="starpy.py --batch <files> [--o_tmpl <output>] [--jobs N] <command> [arguments]",
+            description="Run a command on each of many star files in one process, or in a pool of --jobs worker processes. Each file is given to the command by --i, its output file by --o (built from --o_tmpl). Failures are reported per file.\n\n Example:\n starpy.py --batch \"Class3D/job*/run_it025_data.star\" --o_tmpl \"{dir}/{name}_sel.star\" --jobs 8 select --lb rlnClassNumber --val 3",
+            formatter_class=RawTextHelpFormatter)
+        add = parser.add_argument
+        add('--batch', required=True,
+            help="Input STAR files, a glob pattern (in quotes) or @file with a list of files (one per line).")
+        add('--o_tmpl', default=None,
+            help="Output STAR filename template, {dir} is the directory of the input file, {file} its name and {name} its name without extension. Default: none, the output is printed.")
+        add('--jobs', type=int, default=1, help="Number of files processed in parallel. Default: 1")
+        add('command', help="Command run on each file (see starpy.py --list).")
+        add('args', nargs=argparse.REMAINDER, help="Arguments of the command, without --i and --o.")
+        if len(argv) < 2 or argv[1] in ("-h", "--h", "--help"):
+            parser.print_help()
+            return
+        args = parser.parse_args(argv)
+
+        path = self.scriptPath(args.command)
+        inputs = batchFiles(args.batch)
+        if not inputs:
+            self.error("No input files found for '%s'." % args.batch)
+
+        failed = 0
+        try:
+            for inputPath, result, error in runBatch(path, args.args, inputs, args.o_tmpl, args.jobs):
+                if error is not None:
+                    failed += 1
+                    print("Error: %s: %s" % (inputPath, error), file=sys.stderr)
+                elif args.o_tmpl:
+                    print("%s -> %s" % (inputPath, result[0]))
+                else:
+                    sys.stdout.write(result[1])
+        except ValueError as e:
+            self.error(str(e))
+
+        print("%d of %d files processed, %d failed." % (len(inputs) - failed, len(inputs), failed), file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+    def serve(self, argv):
+        import argparse
+        from lib.server import serve, socketPath, DEFAULT_MEMORY_MB
+
+        parser = argparse.ArgumentParser(prog="starpy.py --serve")
+        add = parser.add_argument
+        add('--serve', action='store_true')
+        add('--socket', default=None, help="Unix socket of the server.")
+        add('--mem_mb', type=int, default=DEFAULT_MEMORY_MB, help="Memory of the star files kept parsed (MB).")
+        args = parser.parse_args(argv)
+
+        print("starpy server listening on %s" % socketPath(args.socket), flush=True)
+        try:
+            serve(args.socket, args.mem_mb, log=lambda message: print(message, flush=True))
+        except RuntimeError as e:
+            self.error(str(e))
+        except KeyboardInterrupt:
+            pass
+
+    def client(self, argv):
+        """ Run a command in the server (see serve) and print its output, exits with the exit code of the command. """
+        from lib.server import request, socketPath
+
+        path = None
+        if argv[:1] == ["--socket"]:
+            path, argv = argv[1] if len(argv) > 1 else None, argv[2:]
+        if not argv:
+            self.error("No command given.")
+        if argv[0] in ("--status", "--stop"):
+            message = {argv[0][len("--"):]: True}
+        else:
+            message = {"argv": argv, "cwd": os.getcwd()}
+            # the input of the commands reading STDIN is sent along, as bytes (it may be compressed)
+            if "--i" not in argv and "--i1" not in argv and not sys.stdin.isatty():
+                import base64
+                message["stdin"] = base64.b64encode(sys.stdin.buffer.read()).decode()
+
+        try:
+            response = request(message, path)
+        except OSError as e:
+            self.error("No starpy server on %s (%s). Start one with starpy.py --serve." % (socketPath(path), e))
+        sys.stdout.write(response["stdout"])
+        sys.stderr.write(response["stderr"])
+        sys.exit(response["code"])
+
+    def main(self):
+        if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--h", "--help"):
+            self.usage()
+        elif sys.argv[1] == "--list":
+            scripts = commands()
+            for command in sorted(scripts):
+                print("%-45s %s" % (command, scripts[command]))
+        elif sys.argv[1] == "--benchmark":
+            self.benchmark()
+        elif sys.argv[1].startswith("--batch"):
+            self.batch(sys.argv[1:])
+        elif sys.argv[1] == "--serve":
+            self.serve(sys.argv[1:])
+        elif sys.argv[1] == "--client":
+            self.client(sys.argv[2:])
+        else:
+            self.run(sys.argv[1], sys.argv[2:])
+
+
+if __name__ == "__main__":
+    StarPy().main()
@@ -34,16 +34,10 @@ class StatsStar:
             self.error("Input file '%s' not found."
                        % args.i)
 
-    def get_records(self, md, dataTable):
-        records = []
-        for record in getattr(md, dataTable):
-            records.append(record)
-        return records
-
-    def statsOnRecords(self, records, iLabels):
+    def statsOnRecords(self, md, dataTable, iLabels):
 
         def average(values):
-            return sum(values) / len(values)
+            return values.sum() / len(values)
 
         labelStats = [["#", "Label", "Min", "Max", "Average"]]
 
@@ -54,14 +48,14 @@ class StatsStar:
                 print("WARNING: Label %s not recognized as RELION label!" % iLabel)
             else:
                 if (LABELS[iLabel] == float) or (LABELS[iLabel] == int):
-                    labelValues = [getattr(x, iLabel) for x in records]
+                    labelValues = md.toNumpy(dataTable, [iLabel])[iLabel]
                     if LABELS[iLabel] == float:
                         labelStats.append(
-                            ['%s' % labelbNr, iLabel, '%.2f' % (min(labelValues),), '%.2f' % (max(labelValues),),
+                            ['%s' % labelbNr, iLabel, '%.2f' % (labelValues.min(),), '%.2f' % (labelValues.max(),),
                              '%.2f' % (average(labelValues),)])
                     if LABELS[iLabel] == int:
                         labelStats.append(
-                            ['%s' % labelbNr, iLabel, '%.d' % (min(labelValues)), '%.d' % (max(labelValues)),
+                            ['%s' % labelbNr, iLabel, '%.d' % (labelValues.min()), '%.d' % (labelValues.max()),
                              '%.d' % (average(labelValues))])
                 else:
                     # non numerical label
@@ -71,7 +65,7 @@ class StatsStar:
         for row in labelStats:
             print("  ".join((val.ljust(width) for val, width in zip(row, widths))))
         print("------------------------------------------------------")
-        print("%s records in star file." % str(len(records)))
+        print("%s records in star file." % str(len(getattr(md, dataTable))))
         print("%s numerical labels and %s non-numerical labels found." % (len(iLabels) - nonNumLabel, nonNumLabel))
 
         return
@@ -81,7 +75,8 @@ class StatsStar:
         args = self.parser.parse_args()
         self.validate(args)
 
-        md = MetaData(args.i)
+        # parse only the columns used for the statistics
+        md = MetaData(args.i, labels=None if args.lb == "ALL" else args.lb.split(" "))
 
         dataTable = args.data
 
@@ -93,9 +88,7 @@ class StatsStar:
         else:
             iLabels = args.lb.split(" ")
 
-        records = self.get_records(md, dataTable)
-
-        self.statsOnRecords(records, iLabels)
+        self.statsOnRecords(md, dataTable, iLabels)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from metadata import MetaData, StarWriter
+
+EMPTY_LOOP = """
+data_optics
+
+loop_
+_rlnOpticsGroup #1
+_rlnVoltage #2
+1 300.0
+
+data_particles
+
+loop_
+_rlnImageName #1
+_rlnAngleRot #2
+_rlnClassNumber #3
+"""
+
+TRAILING_TABLE = """
+data_optics
+
+loop_
+_rlnOpticsGroup #1
+_rlnVoltage #2
+1 300.0
+
+data_particles
+
+loop_
+_rlnImageName #1
+_rlnAngleRot #2
+_rlnClassNumber #3
+1@a.mrcs 10.0 1
+2@a.mrcs 20.0 2
+
+data_model_classes
+
+loop_
+_rlnReferenceImage #1
+_rlnClassDistribution #2
+1@ref.mrcs 0.5
+"""
+
+
+def writeStar(tmp_path, text, name="in.star"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_empty_loop_has_typed_columns(tmp_path):
+    md = MetaData(writeStar(tmp_path, EMPTY_LOOP))
+    particles = md.data_particles
+    assert len(particles) == 0
+    assert md.getLabels("data_particles") == ["rlnImageName", "rlnAngleRot", "rlnClassNumber"]
+    arrays = md.toNumpy("data_particles")
+    assert arrays["rlnAngleRot"].dtype == np.float64 and len(arrays["rlnAngleRot"]) == 0
+    assert arrays["rlnClassNumber"].dtype.kind == "i"
+    assert len(md.groupBy("data_particles", "rlnClassNumber").first()) == 0
+    md.index("data_particles", "rlnImageName")
+
+    md.write(str(tmp_path / "out.star"))
+    md2 = MetaData(str(tmp_path / "out.star"))
+    assert len(md2.data_particles) == 0
+    assert md2.getLabels("data_particles") == md.getLabels("data_particles")
+
+
+def test_iterRows_reads_the_tables_following_the_streamed_one(tmp_path):
+    md = MetaData()
+    rows = md.iterRows(writeStar(tmp_path, TRAILING_TABLE))
+    assert hasattr(md, "data_optics") and not hasattr(md, "data_model_classes")
+    assert [row.rlnAngleRot for row in rows] == [10.0, 20.0]
+    assert md.getLabels("data_model_classes") == ["rlnReferenceImage", "rlnClassDistribution"]
+    assert md.data_model_classes[0].rlnReferenceImage == "1@ref.mrcs"
+
+
+@pytest.mark.parametrize("clone", [False, True])
+def test_StarWriter_round_trip_with_tables_following_the_streamed_one(tmp_path, clone):
+    md = MetaData()
+    tables = md.iterRows(writeStar(tmp_path, TRAILING_TABLE), chunkSize=1)
+    mdOut = md.cloneWithout("data_particles") if clone else md
+    if clone:
+        mdOut.addDataTable("data_particles", True)
+        mdOut.addLabels("data_particles", md.getLabels("data_particles"))
+    output = str(tmp_path / "out.star")
+    with StarWriter(output, mdOut, "data_particles", source=md if clone else None) as writer:
+        for particles in tables:
+            writer.writeRows(particles)
+
+    md2 = MetaData(output)
+    assert md2._tableNames() == ["data_model_classes", "data_optics", "data_particles"]
+    assert [p.rlnImageName for p in md2.data_particles] == ["1@a.mrcs", "2@a.mrcs"]
+    assert md2.data_model_classes[0].rlnReferenceImage == "1@ref.mrcs"
+    with open(output) as f:
+        text = f.read()
+    assert text.index("data_particles") < text.index("data_model_classes")
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from metadata import MetaData
+from lib.pipeline import runPipeline
+from test_metadata import TRAILING_TABLE, writeStar
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PARTICLES = """
+data_optics
+
+loop_
+_rlnOpticsGroup #1
+_rlnVoltage #2
+1 300.0
+
+data_particles
+
+loop_
+_rlnImageName #1
+_rlnAngleRot #2
+_rlnAngleTilt #3
+_rlnAnglePsi #4
+_rlnOriginXAngst #5
+_rlnOriginYAngst #6
+_rlnClassNumber #7
+1@a.mrcs 10.0 20.5 30.25 1.5 -2.0 1
+2@a.mrcs 40.0 50.5 -60.125 0.0 3.0 2
+3@a.mrcs -100.0 170.0 5.0 -1.25 0.5 1
+"""
+
+
+def runScript(script, *args):
+    subprocess.run([sys.executable, os.path.join(REPO, script)] + list(args), check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+@pytest.mark.parametrize("script, args", [
+    ("math_star.py", ["--lb", "rlnAngleRot", "--op", "+", "--val", "3"]),
+    ("math_star.py", ["--data", "data_optics", "--lb", "rlnVoltage", "--op", "+", "--val", "3"]),
+    ("select_values_star.py", ["--lb", "rlnAngleRot", "--op", ">", "--val", "15"]),
+    ("select_orientations_star.py", ["--tilt_min", "0"]),
+])
+def test_streaming_scripts_keep_the_tables_following_the_streamed_one(tmp_path, script, args):
+    output = str(tmp_path / "out.star")
+    runScript(script, "--i", writeStar(tmp_path, TRAILING_TABLE), "--o", output, *args)
+    md = MetaData(output)
+    assert md._tableNames() == ["data_model_classes", "data_optics", "data_particles"]
+    assert md.data_model_classes[0].rlnClassDistribution == 0.5
+    assert len(md.data_particles) in (1, 2)
+
+
+@pytest.mark.parametrize("op, names", [("intersect", ["2@a.mrcs"]), ("except", ["1@a.mrcs"])])
+def test_join_star_intersect_and_except(tmp_path, op, names):
+    input1 = writeStar(tmp_path, TRAILING_TABLE, "in1.star")
+    input2 = writeStar(tmp_path, TRAILING_TABLE.replace("1@a.mrcs 10.0 1\n", ""), "in2.star")
+    output = str(tmp_path / "out.star")
+    runScript("join_star.py", "--i1", input1, "--i2", input2, "--o", output, "--op", op, "--lb", "rlnImageName")
+    assert [p.rlnImageName for p in MetaData(output).data_particles] == names
+
+
+def test_pipe_star_gives_the_values_of_the_shell_pipeline(tmp_path):
+    input = writeStar(tmp_path, PARTICLES)
+    stages = [["select_values_star.py", "--i", input, "--lb", "rlnAngleRot", "--op", ">", "--val", "0"],
+              ["rotate_particles_star.py", "--rot", "90"],
+              ["math_star.py", "--lb", "rlnAnglePsi", "--op", "+", "--val", "1"]]
+    shell = str(tmp_path / "shell.star")
+    with open(shell, "w") as f:
+        commands = " | ".join(" ".join("'%s'" % arg for arg in [sys.executable, os.path.join(REPO, stage[0])] + stage[1:])
+                              for stage in stages)
+        subprocess.run(commands, shell=True, check=True, stdout=f, stderr=subprocess.DEVNULL)
+
+    mdShell = MetaData(shell)
+    mdPipe = runPipeline(stages, capture=True)
+    # rotate_particles_star.py parses the values, the text of the input is not written any more
+    assert not mdPipe.data_optics.tokens and not mdPipe.data_optics.raw
+    # values are handed over at full precision, not rounded to the decimals of the text
+    for dataTableName in ("data_optics", "data_particles"):
+        assert mdPipe.getLabels(dataTableName) == mdShell.getLabels(dataTableName)
+        shellColumns, pipeColumns = mdShell.toNumpy(dataTableName), mdPipe.toNumpy(dataTableName)
+        for label, column in shellColumns.items():
+            if column.dtype == object:
+                assert pipeColumns[label].tolist() == column.tolist()
+            else:
+                assert np.allclose(pipeColumns[label], column, atol=1e-6)
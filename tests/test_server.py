@@ -0,0 +1,28 @@
+import os
+import stat
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lib.server import request, serve
+
+
+def test_server_answers_broken_requests_and_keeps_running(tmp_path):
+    path = str(tmp_path / "starpy.sock")
+    server = threading.Thread(target=serve, args=(path, 64))
+    server.start()
+    for attempt in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) & 0o077 == 0
+        assert request({"cwd": str(tmp_path)}, path)["code"] == 1
+        assert request(["stats"], path)["code"] == 1
+        assert request({"status": True}, path)["code"] == 0
+    finally:
+        request({"stop": True}, path)
+        server.join()
+    assert not os.path.exists(path)
@@ -2,8 +2,28 @@
 
 import os
 import sys
+from functools import partial
 from metadata import MetaData
 import argparse
+from lib.batch import mapFiles
+
+
+def unBinStarFile(outputDir, binning, f):
+    """ Write the coordinates star file f with unbinned coordinates to outputDir. """
+    md = MetaData(f)
+    if md.version == "3.1":
+        dataTableName = "data_particles"
+        mdOut = md.cloneWithout(dataTableName)
+    else:
+        mdOut = MetaData()
+        dataTableName = "data_"
+    particles = getattr(md, dataTableName)
+    for label in ("rlnCoordinateX", "rlnCoordinateY"):
+        particles.setColumn(label, particles.column(label) * binning)
+    mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
+    mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
+    mdOut.addData(dataTableName, particles)
+    mdOut.write(os.path.join(outputDir, os.path.basename(f)))
 
 
 class BinCorrectStar:
@@ -14,6 +34,7 @@ class BinCorrectStar:
         add('--i', help="Input directory with coordinates STAR files.")
         add('--o', help="Output directory.")
         add('--bin', type=float, default=1, help="Binning factor used (--bin 10 will multiply input coordinates by 10.")
+        add('--jobs', type=int, default=1, help="Number of star files processed in parallel. Default: 1")
 
     def usage(self):
         self.parser.print_help()
@@ -32,20 +53,6 @@ class BinCorrectStar:
             self.error("Input directory '%s' not found."
                        % args.i)
 
-    def get_particles(self, md):
-        particles = []
-        for particle in md:
-            particles.append(particle)
-        return particles
-
-    def unBinCoordinates(self, particles, binnnig):
-        newParticles = []
-        for particle in particles:
-            particle.rlnCoordinateX = particle.rlnCoordinateX * binnnig
-            particle.rlnCoordinateY = particle.rlnCoordinateY * binnnig
-            newParticles.append(particle)
-        return newParticles
-
     def main(self):
         self.define_parser()
         args = self.parser.parse_args()
@@ -58,35 +65,28 @@ class BinCorrectStar:
 
         print("Binning correct input star files using binning factor %s." % str(args.bin))
 
+        starFiles = [os.path.join(args.i, filename) for filename in os.listdir(args.i)]
+        # only the files with extension star
+        starFiles = [f for f in starFiles if os.path.isfile(f) and f.split(".")[-1] == "star"]
+
         counter = 0
-        nrOfStarFiles = len(os.listdir(args.i))
-        for filename in os.listdir(args.i):
-            f = os.path.join(args.i, filename)
-            # checking if it is a file with extension star
-            if os.path.isfile(f) and f.split(".")[-1] == "star":
-                md = MetaData(f)
-                new_particles = []
-                particles = self.get_particles(md)
-                new_particles.extend(self.unBinCoordinates(particles, args.bin))
-                if md.version == "3.1":
-                    mdOut = md.clone()
-                    dataTableName = "data_particles"
-                    mdOut.removeDataTable(dataTableName)
-                else:
-                    mdOut = MetaData()
-                    dataTableName = "data_"
-                mdOut.addDataTable(dataTableName, md.isLoop(dataTableName))
-                mdOut.addLabels(dataTableName, md.getLabels(dataTableName))
-                mdOut.addData(dataTableName, new_particles)
-                mdOut.write(os.path.join(args.o, filename))
-                # a simple progress bar
-                sys.stdout.write('\r')
-                progress = int(counter / nrOfStarFiles * 20)
-                sys.stdout.write("[%-20s] %d%%" % ('=' * progress, 5 * progress))
-                sys.stdout.flush()
-
-                counter += 1
-        print("\n %s star files processed. Have fun!" % counter)
+        failed = []
+        for counter, (f, result, error) in enumerate(mapFiles(partial(unBinStarFile, args.o, args.bin), starFiles,
+                                                             args.jobs), start=1):
+            if error is not None:
+                failed.append((f, error))
+            # a simple progress bar
+            sys.stdout.write('\r')
+            progress = int(counter / len(starFiles) * 20)
+            sys.stdout.write("[%-20s] %d%%" % ('=' * progress, 5 * progress))
+            sys.stdout.flush()
+
+        for f, error in failed:
+            print("\nError: %s: %s" % (f, error), end="")
+        print("\n %s star files processed. Have fun!" % (counter - len(failed)))
+        if failed:
+            sys.exit(1)
+
 
 if __name__ == "__main__":
     BinCorrectStar().main()